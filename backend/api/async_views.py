@@ -0,0 +1,175 @@
+"""Асинхронные представления горячих эндпоинтов чтения для ASGI.
+
+Под ASGI Django 3.2 выполняет синхронные представления в одном общем
+потоке процесса, и запросы, ждущие базу, выстраиваются в очередь.
+Здесь аутентификация и проверка прав выполняются в цикле событий,
+а само чтение — прежним вьюсетом DRF в пуле потоков ASYNC_READ_THREADS,
+поэтому запросы одного процесса ходят в базу параллельно. Асинхронного
+ORM в Django 3.2 ещё нет: при переходе на него достаточно заменить
+run_in_pool. Запись по-прежнему выполняется в общем потоке Django.
+"""
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connection
+from django.http import HttpResponse, JsonResponse
+from django.urls import URLPattern, URLResolver
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import (APIException, AuthenticationFailed,
+                                       NotAuthenticated, PermissionDenied)
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+
+from .authentication import CachedTokenAuthentication
+from .profiling import profile_request
+
+ASYNC_ROUTES = {
+    'recipes-list', 'recipes-detail', 'recipes-feed',
+    'tags-list', 'tags-detail',
+    'ingredients-list', 'ingredients-detail',
+    'users-subscriptions',
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(settings.ASYNC_READ_THREADS,
+                                       thread_name_prefix='api-read')
+    return _executor
+
+
+async def run_in_pool(function, *args, **kwargs):
+    """Выполняет синхронную функцию в пуле потоков чтения."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(),
+        functools.partial(context.run, function, *args, **kwargs))
+
+
+async def authenticate(request):
+    """Токен из заголовка Authorization: без токена и при попадании
+    в кэш поток не занимается, остальное проверяет синхронный
+    authenticate в пуле."""
+    authenticator = CachedTokenAuthentication()
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != authenticator.keyword.lower().encode():
+        return None
+    if len(auth) == 2:
+        try:
+            credentials = authenticator.cached_credentials(auth[1].decode())
+        except UnicodeError:
+            credentials = None
+        if credentials is not None:
+            return credentials
+    return await run_in_pool(authenticator.authenticate, request)
+
+
+def check_permissions(view, request):
+    """Права уровня представления, как их проверит DRF."""
+    permission_classes = view.initkwargs.get(
+        'permission_classes', view.cls.permission_classes)
+    drf_request = Request(request)
+    for permission_class in permission_classes:
+        if not permission_class().has_permission(drf_request, None):
+            if not drf_request.successful_authenticator:
+                raise NotAuthenticated()
+            raise PermissionDenied()
+
+
+def error_response(exc):
+    response = JsonResponse(
+        {'detail': exc.detail}, status=exc.status_code,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+    if isinstance(exc, (AuthenticationFailed, NotAuthenticated)):
+        response['WWW-Authenticate'] = CachedTokenAuthentication.keyword
+    return response
+
+
+def call_view(view, request, *args, **kwargs):
+    """Выполняет и рендерит синхронное представление в текущем потоке."""
+    close_old_connections()
+    timer = getattr(request, '_query_timer', None)
+    try:
+        with connection.execute_wrapper(timer) if timer else nullcontext():
+            mode = getattr(request, '_profile_mode', None)
+            if mode is None:
+                response = view(request, *args, **kwargs)
+            else:
+                response = profile_request(
+                    lambda request: view(request, *args, **kwargs),
+                    request, mode)
+            if not hasattr(response, 'render'):
+                return response
+            started = time.perf_counter()
+            response.render()
+            if hasattr(request, '_render_duration'):
+                request._render_duration += time.perf_counter() - started
+    finally:
+        close_old_connections()
+    # Готовый HttpResponse Django не станет рендерить повторно
+    # в общем потоке.
+    plain = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain[header] = value
+    plain.cookies = response.cookies
+    return plain
+
+
+def async_read_view(view):
+    """Асинхронная обёртка над представлением DRF: чтение — в пуле
+    потоков, остальные методы — в общем потоке Django, как у синхронного
+    представления."""
+    write = sync_to_async(call_view, thread_sensitive=True)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return await write(view, request, *args, **kwargs)
+        try:
+            credentials = await authenticate(request)
+            if credentials is not None:
+                request._force_auth_user, request._force_auth_token = (
+                    credentials)
+            check_permissions(view, request)
+        except APIException as exc:
+            return error_response(exc)
+        return await run_in_pool(call_view, view, request, *args, **kwargs)
+    return wrapper
+
+
+def with_async_views(patterns):
+    """Копия маршрутов, в которой горячие эндпоинты чтения асинхронные."""
+    result = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            pattern = URLResolver(
+                pattern.pattern, with_async_views(pattern.url_patterns),
+                pattern.default_kwargs, pattern.app_name, pattern.namespace)
+        elif pattern.name in ASYNC_ROUTES:
+            pattern = URLPattern(
+                pattern.pattern, async_read_view(pattern.callback),
+                pattern.default_args, pattern.name)
+        result.append(pattern)
+    return result
+
+
+class AsyncViewsHandler(ASGIHandler):
+    """ASGIHandler, который разрешает пути по backend.asgi_urls
+    (маршруты with_async_views) вместо ROOT_URLCONF."""
+    urlconf = 'backend.asgi_urls'
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = self.urlconf
+        return request, error_response
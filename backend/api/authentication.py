@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from users.tokens import token_cache_enabled, token_cache_key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который хранит пользователя токена в кэше
+    и не обращается к базе на каждый запрос.
+
+    Записи сбрасываются при удалении токена (выход, смена пароля),
+    при сохранении пользователя (деактивация) и по истечении
+    AUTH_TOKEN_CACHE_TIMEOUT. С кэшем в памяти процесса (LocMemCache)
+    сброс не дошёл бы до других воркеров, поэтому тогда токен каждый
+    раз проверяется по базе.
+    """
+
+    def cached_credentials(self, key):
+        """(пользователь, токен) из кэша или None."""
+        user = cache.get(token_cache_key(key))
+        if user is None:
+            return None
+        return user, self.get_model()(key=key, user=user)
+
+    def authenticate_credentials(self, key):
+        if not token_cache_enabled():
+            return super().authenticate_credentials(key)
+        credentials = self.cached_credentials(key)
+        if credentials is not None:
+            return credentials
+        user, token = super().authenticate_credentials(key)
+        cache.set(token_cache_key(key), user,
+                  settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return user, token
@@ -0,0 +1,295 @@
+"""Нагрузочные сценарии для горячих эндпоинтов API.
+
+Данные создаются в тестовой базе, запросы выполняются тестовым клиентом
+DRF в том же процессе, поэтому измеряется время Django, ORM и базы
+без сети и веб-сервера.
+"""
+import base64
+import itertools
+import random
+import re
+import statistics
+import time
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.counters import rebuild_counters
+from recipes.feed import rebuild_feeds
+from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from recipes.recommendations import build_neighbors
+from recipes.search import rebuild_index
+from recipes.shopping_cart import rebuild_lists
+from users.models import Subscription, User
+
+# Максимальное число SQL-запросов на один вызов эндпоинта, включая
+# проверку токена по базе и метки версий в таблице data_version
+# (с LocMemCache ни токены, ни метки в кэше не хранятся).
+QUERY_BUDGETS = {
+    'recipe_list': 6,
+    'recipe_list_anonymous': 6,
+    'recipe_list_cards': 3,
+    'recipe_detail': 7,
+    'recipe_list_tags': 7,
+    'recipe_list_favorited': 6,
+    'recipe_list_in_cart': 6,
+    'subscriptions': 5,
+    'ingredient_search': 3,
+    'recipe_search': 6,
+    'recipe_cook': 6,
+    'recipe_similar': 6,
+    'recipe_recommended': 7,
+    'recipe_create': 27,
+    'recipe_update': 36,
+    'download_shopping_cart': 2,
+    'favorite_bulk': 10,
+    'feed': 7,
+}
+
+# Индексы, которые должны встречаться в планах запросов сценария (SQLite).
+EXPECTED_INDEXES = {
+    'recipe_list': ('recipe_pub_date_id_idx',),
+    'recipe_list_anonymous': ('recipe_pub_date_id_idx',),
+    'recipe_list_cards': ('recipe_pub_date_id_idx',),
+    'recipe_list_tags': ('recipe_tags_tag_recipe_idx',),
+    'recipe_list_favorited': ('recipe_pub_date_id_idx',),
+    'recipe_list_in_cart': ('recipe_pub_date_id_idx',),
+    'subscriptions': ('recipe_author_pub_date_idx',),
+    'recipe_update': ('shopping_cart_recipe_user_idx',),
+}
+# Таблицы, которые можно читать целиком: в них единицы строк.
+SMALL_TABLES = {'tag'}
+
+
+def make_image():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def bulk_create(model, objects, **kwargs):
+    """bulk_create, возвращающий объекты с первичными ключами
+    на любой базе."""
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    model.objects.bulk_create(objects, batch_size=1000, **kwargs)
+    return list(model.objects.filter(pk__gt=last or 0).order_by('pk'))
+
+
+def seed(users=50, recipes=500, ingredients=200, ingredients_per_recipe=8,
+         favorites=20, subscriptions=10, seed=0):
+    """Заполняет базу данными заданного объёма."""
+    rng = random.Random(seed)
+    authors = bulk_create(User, [
+        User(email=f'bench{i}@example.com', username=f'bench{i}',
+             first_name='Bench', last_name=str(i), password='!')
+        for i in range(users)
+    ])
+    tags = bulk_create(Tag, [
+        Tag(name=name, slug=slug, color=color)
+        for name, slug, color in (('Завтрак', 'breakfast', '#E26C2D'),
+                                  ('Обед', 'lunch', '#49B64E'),
+                                  ('Ужин', 'dinner', '#8775D2'))
+    ])
+    catalog = bulk_create(Ingredient, [
+        Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+        for i in range(ingredients)
+    ])
+    image = Recipe._meta.get_field('image').storage.save(
+        'recipes/bench.png', ContentFile(make_image()))
+    created = bulk_create(Recipe, [
+        Recipe(author=rng.choice(authors), name=f'Рецепт {i}',
+               text='Описание рецепта ' * 20,
+               cooking_time=rng.randint(1, 120), image=image)
+        for i in range(recipes)
+    ])
+    RecipeTag = Recipe.tags.through
+    RecipeTag.objects.bulk_create([
+        RecipeTag(recipe=recipe, tag=tag)
+        for recipe in created for tag in rng.sample(tags, rng.randint(1, 3))
+    ])
+    per_recipe = min(ingredients_per_recipe, len(catalog))
+    AmountIngredient.objects.bulk_create([
+        AmountIngredient(recipe=recipe, ingredients=ingredient,
+                         amount=rng.randint(1, 500))
+        for recipe in created for ingredient in rng.sample(catalog, per_recipe)
+    ], batch_size=1000)
+    for model, count in ((Favorite, favorites), (ShoppingCart, favorites)):
+        model.objects.bulk_create([
+            model(user=user, recipe=recipe)
+            for user in authors
+            for recipe in rng.sample(created, min(count, len(created)))
+        ], batch_size=1000)
+    Subscription.objects.bulk_create([
+        Subscription(user=user, author=author)
+        for user in authors
+        for author in rng.sample(authors, min(subscriptions + 1, len(authors)))
+        if author != user
+    ], batch_size=1000)
+    rebuild_counters()
+    rebuild_index()
+    rebuild_lists()
+    rebuild_feeds()
+    build_neighbors(full=True)
+    cache.clear()
+    return authors, tags, catalog, created
+
+
+def recipe_payload(tags, catalog, rng, ingredients_per_recipe):
+    image = base64.b64encode(make_image()).decode()
+    return {
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': rng.randint(1, 120),
+        'image': f'data:image/png;base64,{image}',
+        'tags': [tag.pk for tag in rng.sample(tags, 2)],
+        'ingredients': [
+            {'id': ingredient.pk, 'amount': rng.randint(1, 500)}
+            for ingredient in rng.sample(
+                catalog, min(ingredients_per_recipe, len(catalog)))
+        ],
+    }
+
+
+def scenarios(authors, tags, catalog, recipes, ingredients_per_recipe,
+              seed=0):
+    """Возвращает словарь имя сценария -> функция, выполняющая запрос."""
+    rng = random.Random(seed)
+    user = authors[0]
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+    anonymous = APIClient()
+    detail = recipes[len(recipes) // 2]
+    own = Recipe.objects.filter(author=user).first() or recipes[0]
+    if own.author_id != user.pk:
+        own.author = user
+        own.save()
+
+    def create():
+        return client.post(
+            '/api/recipes/',
+            recipe_payload(tags, catalog, rng, ingredients_per_recipe),
+            format='json')
+
+    def update():
+        return client.put(
+            f'/api/recipes/{own.pk}/',
+            recipe_payload(tags, catalog, rng, ingredients_per_recipe),
+            format='json')
+
+    bulk = {'recipes': [recipe.pk for recipe in recipes[-20:]]}
+    toggle = itertools.cycle((client.post, client.delete))
+
+    def favorite_bulk():
+        return next(toggle)('/api/recipes/favorite/', bulk, format='json')
+
+    return {
+        'recipe_list': lambda: client.get('/api/recipes/?limit=6'),
+        'recipe_list_anonymous': lambda: anonymous.get(
+            '/api/recipes/?limit=6&page=2'),
+        'recipe_list_cards': lambda: client.get(
+            '/api/recipes/?limit=6&fields=id,name,image,cooking_time'),
+        'recipe_detail': lambda: client.get(f'/api/recipes/{detail.pk}/'),
+        'recipe_list_tags': lambda: client.get(
+            f'/api/recipes/?tags={tags[0].slug}&tags={tags[1].slug}'),
+        'recipe_list_favorited': lambda: client.get(
+            '/api/recipes/?is_favorited=1'),
+        'recipe_list_in_cart': lambda: client.get(
+            '/api/recipes/?is_in_shopping_cart=1'),
+        'subscriptions': lambda: client.get(
+            '/api/users/subscriptions/?recipes_limit=3'),
+        'ingredient_search': lambda: client.get(
+            '/api/ingredients/?name=ингредиент 1'),
+        'recipe_search': lambda: client.get(
+            '/api/recipes/?search=рецепт 1'),
+        'recipe_cook': lambda: client.get(
+            '/api/recipes/cook/?ingredients='
+            + ','.join(str(ingredient.pk) for ingredient in catalog[:10])),
+        'recipe_similar': lambda: client.get(
+            f'/api/recipes/{detail.pk}/similar/'),
+        'recipe_recommended': lambda: client.get(
+            '/api/recipes/recommended/'),
+        'recipe_create': create,
+        'recipe_update': update,
+        'download_shopping_cart': lambda: client.get(
+            '/api/recipes/download_shopping_cart/'),
+        'favorite_bulk': favorite_bulk,
+        'feed': lambda: client.get('/api/recipes/feed/?limit=6'),
+    }
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def measure(call, iterations, warmup=1):
+    """Запускает сценарий и возвращает задержки и число SQL-запросов."""
+    for _ in range(warmup):
+        call()
+    timings = []
+    queries = 0
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = call()
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise AssertionError(
+                f'HTTP {response.status_code}: {response.content[:200]!r}')
+        queries = max(queries, len(captured))
+    return {
+        'iterations': iterations,
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p90_ms': round(percentile(timings, 90), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'queries': queries,
+    }
+
+
+def explain(call):
+    """Выполняет сценарий и возвращает планы SQLite его SELECT-запросов
+    (см. api.tests.test_query_plans)."""
+    cache.clear()
+    with CaptureQueriesContext(connection) as captured:
+        response = call()
+        if response.streaming:
+            b''.join(response.streaming_content)
+    plans = []
+    with connection.cursor() as cursor:
+        for query in captured:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+            plans.append((query['sql'], [row[3] for row in cursor]))
+    return plans
+
+
+def check_plans(name, plans):
+    """Ищет в планах полные просмотры таблиц и неиспользуемые индексы."""
+    failures = []
+    details = [detail for _, plan in plans for detail in plan]
+    for index in EXPECTED_INDEXES.get(name, ()):
+        if not any(re.search(rf'\b{index}\b', detail)
+                   for detail in details):
+            failures.append(f'{name}: не используется индекс {index}')
+    for sql, plan in plans:
+        for detail in plan:
+            # SCAN subquery — обход результата подзапроса, а не таблицы.
+            match = re.match(r'SCAN (?!subquery)(\w+)', detail)
+            if (match and 'INDEX' not in detail
+                    and match.group(1) not in SMALL_TABLES):
+                failures.append(
+                    f'{name}: полный просмотр {match.group(1)} в {sql[:200]}')
+    return failures
@@ -0,0 +1,58 @@
+from functools import wraps
+from hashlib import md5
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from recipes.versions import get_versions
+
+
+def query_string(request):
+    """Параметры запроса в каноническом виде: имена и значения
+    отсортированы."""
+    return '&'.join(
+        f'{name}={",".join(sorted(request.query_params.getlist(name)))}'
+        for name in sorted(request.query_params)
+    )
+
+
+def conditional(version_keys, per_user=False, max_age=0):
+    """Отвечает 304 по If-None-Match / If-Modified-Since до сериализации.
+
+    Валидаторы строятся из меток версий, которые возвращает
+    version_keys(request); per_user добавляет в ETag пользователя
+    и делает ответ приватным для авторизованных.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            versions = get_versions(version_keys(request))
+            # Любой параметр (фильтр, страница, разреженные поля)
+            # даёт другое представление ресурса.
+            state = [request.accepted_renderer.format, query_string(request)]
+            state.extend(versions[key][0] for key in sorted(versions))
+            if per_user:
+                state.append(request.user.pk)
+            etag = quote_etag(md5(repr(state).encode()).hexdigest())
+            last_modified = max(
+                filter(None, (modified for _, modified in versions.values())),
+                default=None)
+            response = get_conditional_response(
+                request._request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            if per_user:
+                patch_vary_headers(response, ('Authorization',))
+            if per_user and request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, public=True, max_age=max_age)
+            return response
+        return wrapper
+    return decorator
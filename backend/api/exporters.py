@@ -0,0 +1,63 @@
+import csv
+from io import BytesIO
+from itertools import chain
+
+from django.conf import settings
+
+
+class Echo:
+    """Псевдобуфер для потоковой записи csv."""
+    def write(self, value):
+        return value
+
+
+def export_txt(recipes_count, rows):
+    yield f'Всего рецептов: {recipes_count}\n\nСписок покупок:\n'
+    for name, measurement_unit, amount in rows:
+        yield f'{name.capitalize()} {amount} {measurement_unit}\n'
+
+
+def export_csv(recipes_count, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for name, measurement_unit, amount in rows:
+        yield writer.writerow((name.capitalize(), amount, measurement_unit))
+
+
+def export_pdf(recipes_count, rows):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'Helvetica'
+    if settings.SHOPPING_LIST_PDF_FONT:
+        font = 'ShoppingListFont'
+        pdfmetrics.registerFont(
+            TTFont(font, settings.SHOPPING_LIST_PDF_FONT))
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    lines = chain(
+        (f'Всего рецептов: {recipes_count}', '', 'Список покупок:'),
+        (f'{name.capitalize()} {amount} {measurement_unit}'
+         for name, measurement_unit, amount in rows),
+    )
+    y = 0
+    for line in lines:
+        if y < 50:
+            if y:
+                pdf.showPage()
+            pdf.setFont(font, 12)
+            y = height - 50
+        pdf.drawString(50, y, line)
+        y -= 18
+    pdf.save()
+    yield buffer.getvalue()
+
+
+EXPORTERS = {
+    'txt': (export_txt, 'text/plain; charset=utf-8'),
+    'csv': (export_csv, 'text/csv; charset=utf-8'),
+    'pdf': (export_pdf, 'application/pdf'),
+}
@@ -1,12 +1,57 @@
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework.exceptions import ValidationError
 from rest_framework.fields import Field
+from rest_framework.permissions import SAFE_METHODS
 
+from recipes.images import variant_url
 from recipes.models import Recipe
 
+SPARSE_PARAMS = ('fields', 'omit')
+
+
+def get_recipes_limit(request):
+    """Возвращает значение параметра recipes_limit или None."""
+    if request is None:
+        return None
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
+def split_names(value):
+    return {name.strip() for name in (value or '').split(',')
+            if name.strip()}
+
+
+def get_sparse_fields(request, field_names):
+    """Поля ответа на чтение по ?fields=a,b и ?omit=c в порядке
+    field_names или None, если нужны все."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    only = split_names(request.query_params.get('fields'))
+    omit = split_names(request.query_params.get('omit'))
+    if not only and not omit:
+        return None
+    unknown = (only | omit).difference(field_names)
+    if unknown:
+        raise ValidationError(
+            {'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}'})
+    return [name for name in field_names
+            if (not only or name in only) and name not in omit]
+
 
 class RecipeSubscribeUserField(Field):
 
     def get_attribute(self, instance):
-        return Recipe.objects.filter(author=instance.author)
+        if hasattr(instance.author, 'limited_recipes'):
+            return instance.author.limited_recipes
+        recipes = Recipe.objects.filter(author=instance.author)
+        limit = get_recipes_limit(self.context.get('request'))
+        if limit is not None:
+            recipes = recipes[:limit]
+        return recipes
 
     def to_representation(self, recipes_list):
         recipes_data = []
@@ -15,8 +60,27 @@ class RecipeSubscribeUserField(Field):
                 {
                     "id": recipes.id,
                     "name": recipes.name,
-                    "image": recipes.image.url,
+                    "image": variant_url(recipes, 'card'),
                     "cooking_time": recipes.cooking_time,
                 }
             )
         return recipes_data
+
+
+class RecipeImageField(Base64ImageField):
+    """Картинка рецепта: принимает base64, отдаёт URL копии размера,
+    подходящего для контекста (карточка или страница рецепта)."""
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        variant = self.variant or self.context.get('image_variant', 'detail')
+        url = variant_url(value.instance, variant)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
@@ -1,29 +1,41 @@
-from django_filters.rest_framework import AllValuesMultipleFilter, BooleanFilter, FilterSet
-from rest_framework.filters import SearchFilter
+from django_filters.rest_framework import (BooleanFilter, CharFilter,
+                                           FilterSet,
+                                           ModelMultipleChoiceFilter)
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import Recipe
+from recipes.models import Recipe, Tag
+from recipes.search import search
+from .pagination import KeysetPagination
 
 
 class RecipesFilter(FilterSet):
 
-    tags = AllValuesMultipleFilter(field_name='tags__slug', label='tags')
+    # Варианты проверяются по таблице тэгов только при наличии ?tags=,
+    # а не перебором всех рецептов на каждый запрос.
+    tags = ModelMultipleChoiceFilter(field_name='tags__slug',
+                                     to_field_name='slug',
+                                     queryset=Tag.objects.all(),
+                                     label='tags')
     is_favorited = BooleanFilter(method='get_favorite')
     is_in_shopping_cart = BooleanFilter(method='get_shopping_cart')
+    search = CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
 
     def get_favorite(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorite__user=self.request.user)
-        return queryset.exclude(favorite__user=self.request.user)
+        return queryset.filter(is_favorited=value)
 
     def get_shopping_cart(self, queryset, name, value):
-        if value:
-            return Recipe.objects.filter(shopping_cart__user=self.request.user)
-        return queryset.exclude(shopping_cart__user=self.request.user)
-
-
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+        return queryset.filter(is_in_shopping_cart=value)
+
+    def get_search(self, queryset, name, value):
+        # Курсор задаёт свой порядок и потерял бы ранжирование.
+        if (self.request is not None
+                and KeysetPagination.cursor_query_param
+                in self.request.query_params):
+            raise ValidationError(
+                {'cursor': 'Результаты поиска листаются через page'})
+        return search(queryset, value)
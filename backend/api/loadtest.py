@@ -0,0 +1,193 @@
+"""Сравнение WSGI- и ASGI-сборки под конкурентной нагрузкой.
+
+Запросы передаются прямо обработчикам Django (WSGIHandler и ASGIHandler)
+в одном процессе, без сети: WSGI-воркер обслуживает не больше threads
+запросов одновременно, как синхронный воркер gunicorn, ASGI-воркер —
+один цикл событий. Задержка считается со стороны клиента, вместе
+с ожиданием свободного воркера.
+"""
+import asyncio
+import itertools
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+
+from .benchmarks import percentile
+
+
+def load_requests(authors, recipes):
+    """Сценарии нагрузки: имя -> (путь, строка запроса, токен)."""
+    token = Token.objects.get_or_create(user=authors[0])[0].key
+    detail = recipes[len(recipes) // 2]
+    return {
+        'recipe_list': ('/api/recipes/', 'limit=6', token),
+        'recipe_list_anonymous': ('/api/recipes/', 'limit=6&page=2', None),
+        'recipe_detail': (f'/api/recipes/{detail.pk}/', '', token),
+        'tags': ('/api/tags/', '', None),
+        'ingredients': ('/api/ingredients/',
+                        urlencode({'name': 'ингредиент 1'}), None),
+        'subscriptions': ('/api/users/subscriptions/', 'recipes_limit=3',
+                          token),
+    }
+
+
+def simulate_db_latency(seconds):
+    """Добавляет задержку сети к каждому SQL-запросу во всех потоках.
+    Возвращает функцию, которая убирает задержку."""
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(connection, **kwargs):
+        # В начало списка: соединение открывается лениво, когда
+        # execute_wrapper middleware уже добавил свою обёртку и потом
+        # снимет последнюю.
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, wrapper)
+
+    connection_created.connect(install, weak=False)
+    install(connections['default'])
+
+    def uninstall():
+        connection_created.disconnect(install)
+        if wrapper in connections['default'].execute_wrappers:
+            connections['default'].execute_wrappers.remove(wrapper)
+    return uninstall
+
+
+def wsgi_call(handler, path, query, token):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+    statuses = []
+    result = handler(
+        environ, lambda status, headers, exc_info=None:
+        statuses.append(status))
+    try:
+        b''.join(result)
+    finally:
+        result.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_call(handler, path, query, token):
+    headers = [(b'host', b'testserver')]
+    if token:
+        headers.append((b'authorization', f'Token {token}'.encode()))
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    statuses = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await handler(scope, receive, send)
+    return statuses[0]
+
+
+def summarize(latencies, statuses, duration):
+    errors = sum(status >= 400 for status in statuses)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 1),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+
+def run_wsgi(handler, requests, total, concurrency, threads=1):
+    """concurrency клиентов шлют total запросов WSGI-воркеру
+    с threads потоками."""
+    worker = ThreadPoolExecutor(threads)
+    counter = itertools.count()
+    latencies = []
+    statuses = []
+
+    def client():
+        while True:
+            index = next(counter)
+            if index >= total:
+                return
+            started = time.perf_counter()
+            # Очередь пула FIFO, как очередь соединений воркера.
+            status = worker.submit(
+                wsgi_call, handler, *requests[index % len(requests)]
+            ).result()
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses.append(status)
+
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    worker.shutdown()
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+def run_asgi(handler, requests, total, concurrency):
+    """concurrency клиентов шлют total запросов ASGI-воркеру."""
+    counter = itertools.count()
+    latencies = []
+    statuses = []
+
+    async def client():
+        while True:
+            index = next(counter)
+            if index >= total:
+                return
+            started = time.perf_counter()
+            status = await asgi_call(handler,
+                                     *requests[index % len(requests)])
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses.append(status)
+
+    async def main():
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    duration = asyncio.run(main())
+    return summarize(latencies, statuses, duration)
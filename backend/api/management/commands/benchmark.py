@@ -0,0 +1,113 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from api import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержки и число SQL-запросов горячих эндпоинтов '
+            'на тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Избранного и рецептов в корзине '
+                                 'на пользователя.')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--only', nargs='*',
+                            choices=benchmarks.QUERY_BUDGETS.keys(),
+                            help='Запустить только указанные сценарии.')
+        parser.add_argument('--output', help='Файл для результатов в JSON.')
+        parser.add_argument('--baseline',
+                            help='Результаты прошлого запуска для сравнения.')
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help='Допустимый рост p50 относительно '
+                                 'baseline, доля.')
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(MEDIA_ROOT=tempfile.mkdtemp(),
+                                   IMAGE_VARIANT_WORKERS=0,
+                                   FEED_FANOUT_WORKERS=0):
+                results = self.run_benchmarks(options)
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        report = {
+            'config': {key: options[key] for key in (
+                'users', 'recipes', 'ingredients', 'ingredients_per_recipe',
+                'favorites', 'subscriptions', 'iterations')},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<24} p50 {result["p50_ms"]:>8.2f} ms  '
+                f'p90 {result["p90_ms"]:>8.2f} ms  '
+                f'p99 {result["p99_ms"]:>8.2f} ms  '
+                f'queries {result["queries"]:>3}')
+
+        failures = self.check_budgets(results)
+        if options['baseline']:
+            failures += self.check_regressions(
+                results, options['baseline'], options['max_regression'])
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все сценарии в пределах норм'))
+
+    def run_benchmarks(self, options):
+        data = benchmarks.seed(
+            users=options['users'],
+            recipes=options['recipes'],
+            ingredients=options['ingredients'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            favorites=options['favorites'],
+            subscriptions=options['subscriptions'],
+        )
+        scenarios = benchmarks.scenarios(
+            *data, ingredients_per_recipe=options['ingredients_per_recipe'])
+        selected = {name: call for name, call in scenarios.items()
+                    if not options['only'] or name in options['only']}
+        return {
+            name: benchmarks.measure(call, options['iterations'])
+            for name, call in selected.items()
+        }
+
+    @staticmethod
+    def check_budgets(results):
+        return [
+            f'{name}: {result["queries"]} SQL-запросов, '
+            f'бюджет {benchmarks.QUERY_BUDGETS[name]}'
+            for name, result in results.items()
+            if result['queries'] > benchmarks.QUERY_BUDGETS[name]
+        ]
+
+    @staticmethod
+    def check_regressions(results, path, max_regression):
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        failures = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            limit = baseline[name]['p50_ms'] * (1 + max_regression)
+            if result['p50_ms'] > limit:
+                failures.append(
+                    f'{name}: p50 {result["p50_ms"]} ms, '
+                    f'baseline {baseline[name]["p50_ms"]} ms')
+        return failures
@@ -0,0 +1,109 @@
+import json
+import tempfile
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from api import benchmarks, loadtest
+from api.async_views import AsyncViewsHandler
+
+LOAD_SCENARIOS = ('recipe_list', 'recipe_list_anonymous', 'recipe_detail',
+                  'tags', 'ingredients', 'subscriptions')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность и p99 синхронной WSGI- '
+            'и асинхронной ASGI-сборки под конкурентной нагрузкой '
+            'на тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Запросов на сборку и сценарий.')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--wsgi-threads', type=int, default=1,
+                            help='Потоков WSGI-воркера; 1 — синхронный '
+                                 'воркер gunicorn.')
+        parser.add_argument('--read-threads', type=int,
+                            help='Пул потоков чтения ASGI-сборки, '
+                                 'по умолчанию ASYNC_READ_THREADS.')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Искусственная задержка каждого '
+                                 'SQL-запроса, мс: имитирует сетевую '
+                                 'базу.')
+        parser.add_argument('--only', nargs='*', choices=LOAD_SCENARIOS,
+                            help='Запустить только указанные сценарии.')
+        parser.add_argument('--output', help='Файл для результатов в JSON.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests и --concurrency должны быть '
+                               'положительными')
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        overrides = {'MEDIA_ROOT': tempfile.mkdtemp(),
+                     'IMAGE_VARIANT_WORKERS': 0, 'FEED_FANOUT_WORKERS': 0}
+        if options['read_threads']:
+            overrides['ASYNC_READ_THREADS'] = options['read_threads']
+        try:
+            with override_settings(**overrides):
+                results = self.run_load(options)
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({
+                    'config': {key: options[key] for key in (
+                        'users', 'recipes', 'requests', 'concurrency',
+                        'wsgi_threads', 'read_threads', 'db_latency')},
+                    'results': results,
+                }, f, ensure_ascii=False, indent=2)
+        for name, builds in results.items():
+            for build, result in builds.items():
+                self.stdout.write(
+                    f'{name:<22} {build:<5} {result["rps"]:>8.1f} req/s  '
+                    f'p50 {result["p50_ms"]:>8.2f} ms  '
+                    f'p99 {result["p99_ms"]:>8.2f} ms  '
+                    f'ошибок {result["errors"]}')
+        failed = [name for name, builds in results.items()
+                  if any(result['errors'] for result in builds.values())]
+        if failed:
+            raise CommandError(f'Ошибки в ответах: {", ".join(failed)}')
+
+    def run_load(self, options):
+        authors, _, _, recipes = benchmarks.seed(
+            users=options['users'], recipes=options['recipes'],
+            ingredients=options['ingredients'])
+        requests = loadtest.load_requests(authors, recipes)
+        selected = options['only'] or LOAD_SCENARIOS
+        uninstall = None
+        if options['db_latency']:
+            uninstall = loadtest.simulate_db_latency(
+                options['db_latency'] / 1000)
+        wsgi = WSGIHandler()
+        asgi = AsyncViewsHandler()
+        results = {}
+        try:
+            for name in selected:
+                batch = [requests[name]]
+                warmup = min(options['concurrency'], options['requests'])
+                loadtest.run_wsgi(wsgi, batch, warmup, 1)
+                results[name] = {'wsgi': loadtest.run_wsgi(
+                    wsgi, batch, options['requests'],
+                    options['concurrency'], options['wsgi_threads'])}
+                loadtest.run_asgi(asgi, batch, warmup, 1)
+                results[name]['asgi'] = loadtest.run_asgi(
+                    asgi, batch, options['requests'],
+                    options['concurrency'])
+        finally:
+            if uninstall is not None:
+                uninstall()
+        return results
@@ -0,0 +1,65 @@
+import glob
+import os
+import pstats
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SORT_KEYS = {
+    'cumulative': 3,
+    'tottime': 2,
+    'calls': 1,
+}
+
+
+class Command(BaseCommand):
+    help = ('Сводка по сохранённым профилям запросов: самые горячие '
+            'функции по всем запросам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=settings.PROFILER_DIR,
+                            help='Каталог с профилями, по умолчанию '
+                                 'PROFILER_DIR.')
+        parser.add_argument('--match', default='',
+                            help='Учитывать только профили, в имени '
+                                 'которых есть эта строка.')
+        parser.add_argument('--sort', choices=SORT_KEYS.keys(),
+                            default='cumulative')
+        parser.add_argument('--limit', type=int, default=30)
+
+    def handle(self, *args, **options):
+        directory = options['dir']
+        if not directory:
+            raise CommandError('Не задан каталог профилей: PROFILER_DIR '
+                               'или --dir')
+        paths = [path for path in glob.glob(os.path.join(directory, '*.prof'))
+                 if options['match'] in os.path.basename(path)]
+        if not paths:
+            raise CommandError(f'В {directory} нет профилей')
+
+        # Функция -> [запросов, вызовов, собственное время, общее время].
+        totals = defaultdict(lambda: [0, 0, 0.0, 0.0])
+        for path in paths:
+            try:
+                stats = pstats.Stats(path).stats
+            except (OSError, TypeError, ValueError, EOFError):
+                self.stderr.write(f'Пропущен повреждённый профиль {path}')
+                continue
+            for function, (_, calls, tottime, cumtime, _) in stats.items():
+                total = totals[function]
+                total[0] += 1
+                total[1] += calls
+                total[2] += tottime
+                total[3] += cumtime
+
+        index = SORT_KEYS[options['sort']]
+        hottest = sorted(totals.items(), key=lambda item: item[1][index],
+                         reverse=True)[:options['limit']]
+        self.stdout.write(f'Профилей: {len(paths)}')
+        self.stdout.write(f'{"запр.":>6} {"вызовы":>9} {"tottime":>9} '
+                          f'{"cumtime":>9}  функция')
+        for function, (requests, calls, tottime, cumtime) in hottest:
+            name = pstats.func_std_string(function)
+            self.stdout.write(f'{requests:>6} {calls:>9} {tottime:>9.3f} '
+                              f'{cumtime:>9.3f}  {name}')
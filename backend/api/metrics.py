@@ -0,0 +1,189 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+from django.conf import settings
+
+# Границы корзин гистограммы длительности запроса, в секундах.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': 'Длительность обработки запроса.',
+}
+COUNTERS = {
+    'foodgram_requests_total': 'Количество запросов.',
+    'foodgram_db_queries_total': 'Количество SQL-запросов.',
+    'foodgram_db_duration_seconds_total': 'Время в базе данных.',
+    'foodgram_serialize_duration_seconds_total': (
+        'Время сериализации ответа (.data сериализатора).'),
+    'foodgram_render_duration_seconds_total': 'Время рендеринга ответа.',
+    'foodgram_response_bytes_total': 'Размер ответов в байтах.',
+}
+
+
+class SerializeTimerMixin:
+    """Добавляет время вычисления .data сериализатора ответа
+    к request._serialize_duration, которое собирает MetricsMiddleware.
+    Вложенный вызов .data (сериализатор внутри сериализатора) отдельно
+    не считается."""
+
+    @property
+    def data(self):
+        request = self.context.get('request')
+        request = getattr(request, '_request', request)
+        if (not hasattr(request, '_serialize_duration')
+                or getattr(request, '_serializing', False)):
+            return super().data
+        request._serializing = True
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            request._serializing = False
+            request._serialize_duration += time.perf_counter() - started
+
+
+def metric_key(name, labels):
+    return json.dumps([name, labels], ensure_ascii=False)
+
+
+class MetricsRegistry:
+    """Метрики запросов одного процесса.
+
+    В многопроцессном режиме (задан METRICS_MULTIPROC_DIR) каждый
+    воркер не чаще раза в METRICS_FLUSH_INTERVAL секунд сбрасывает
+    снимок в файл, а эндпоинт метрик складывает снимки всех воркеров.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._histograms = defaultdict(lambda: [0] * (len(BUCKETS) + 2))
+        self._counters = defaultdict(float)
+        self._flushed_at = 0
+
+    def observe_request(self, route, method, status, duration, queries,
+                        db_duration, serialize_duration, render_duration,
+                        size):
+        labels = {'route': route, 'method': method}
+        with self._lock:
+            histogram = self._histograms[metric_key(
+                'foodgram_request_duration_seconds', labels)]
+            histogram[bisect_left(BUCKETS, duration)] += 1
+            histogram[-1] += duration
+            counters = self._counters
+            counters[metric_key('foodgram_requests_total',
+                                dict(labels, status=str(status)))] += 1
+            counters[metric_key('foodgram_db_queries_total', labels)] += (
+                queries)
+            counters[metric_key('foodgram_db_duration_seconds_total',
+                                labels)] += db_duration
+            counters[metric_key('foodgram_serialize_duration_seconds_total',
+                                labels)] += serialize_duration
+            counters[metric_key('foodgram_render_duration_seconds_total',
+                                labels)] += render_duration
+            if size is not None:
+                counters[metric_key('foodgram_response_bytes_total',
+                                    labels)] += size
+        if settings.METRICS_MULTIPROC_DIR:
+            self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'histograms': {key: list(value)
+                               for key, value in self._histograms.items()},
+                'counters': dict(self._counters),
+            }
+
+    def maybe_flush(self):
+        now = time.monotonic()
+        if now - self._flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self._flushed_at = now
+        self.flush()
+
+    def flush(self):
+        directory = settings.METRICS_MULTIPROC_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """Снимок метрик: своего процесса или всех воркеров."""
+        directory = settings.METRICS_MULTIPROC_DIR
+        if not directory:
+            return self.snapshot()
+        self.flush()
+        snapshots = []
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name),
+                          encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return merge(snapshots)
+
+
+def merge(snapshots):
+    histograms = defaultdict(lambda: [0] * (len(BUCKETS) + 2))
+    counters = defaultdict(float)
+    for snapshot in snapshots:
+        for key, values in snapshot['histograms'].items():
+            histogram = histograms[key]
+            for index, value in enumerate(values):
+                histogram[index] += value
+        for key, value in snapshot['counters'].items():
+            counters[key] += value
+    return {'histograms': dict(histograms), 'counters': dict(counters)}
+
+
+def format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+        for name, value in labels.items())
+
+
+def render_prometheus(snapshot):
+    """Текстовый формат экспозиции Prometheus."""
+    by_name = defaultdict(list)
+    for key, values in snapshot['histograms'].items():
+        name, labels = json.loads(key)
+        by_name[name].append((labels, values))
+    lines = []
+    for name, help_text in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, values in by_name[name]:
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{name}_bucket{{'
+                             f'{format_labels(labels, le=bound)}}} '
+                             f'{cumulative}')
+            lines.append(f'{name}_sum{{{format_labels(labels)}}} '
+                         f'{values[-1]}')
+            lines.append(f'{name}_count{{{format_labels(labels)}}} '
+                         f'{cumulative}')
+    by_name = defaultdict(list)
+    for key, value in snapshot['counters'].items():
+        name, labels = json.loads(key)
+        by_name[name].append((labels, value))
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for labels, value in by_name[name]:
+            lines.append(f'{name}{{{format_labels(labels)}}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+
+from .metrics import registry
+from .profiling import profile_request, requested_mode, should_profile
+
+
+class QueryTimer:
+    """Обёртка execute_wrapper: считает SQL-запросы и время в базе."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class HybridMiddleware:
+    """Основа для middleware, работающих и под WSGI, и под ASGI без
+    переключения в общий синхронный поток Django."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django распознаёт экземпляр как асинхронный.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process(request)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Собирает метрики запроса и добавляет заголовок Server-Timing.
+
+    Маршрут берётся из имени URL (например, api:recipes-list), чтобы
+    метрики не дробились по идентификаторам в пути. Под ASGI запросы
+    к базе считаются только у асинхронных представлений: таймер
+    передаётся им в request._query_timer.
+    """
+
+    def process(self, request):
+        timer = QueryTimer()
+        request._serialize_duration = request._render_duration = 0.0
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        return self.observe(request, response, timer, started)
+
+    async def __acall__(self, request):
+        timer = request._query_timer = QueryTimer()
+        request._serialize_duration = request._render_duration = 0.0
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        return self.observe(request, response, timer, started)
+
+    def observe(self, request, response, timer, started):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        registry.observe_request(
+            route, request.method, response.status_code, duration,
+            timer.count, timer.duration, request._serialize_duration,
+            request._render_duration, size)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timer.duration * 1000:.2f};'
+            f'desc="{timer.count} queries"',
+            f'serialize;dur={request._serialize_duration * 1000:.2f}',
+            f'render;dur={request._render_duration * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ))
+        return response
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._render_duration += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ProfilerMiddleware(HybridMiddleware):
+    """Профилирует запросы персонала, отмеченные X-Profile
+    или ?profile=.
+
+    Под ASGI профилируется только синхронная часть асинхронных
+    представлений: режим передаётся им в request._profile_mode.
+    """
+
+    def process(self, request):
+        mode = should_profile(request)
+        if mode is None:
+            return self.get_response(request)
+        return profile_request(self.get_response, request, mode)
+
+    async def __acall__(self, request):
+        if requested_mode(request) is not None:
+            request._profile_mode = await sync_to_async(should_profile)(
+                request)
+        return await self.get_response(request)
@@ -0,0 +1,10 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class IgnoreFormatContentNegotiation(DefaultContentNegotiation):
+    """Не использует параметр ?format= для выбора рендерера:
+    во вьюхах с ним он означает формат выгружаемого файла."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = renderers[0]
+        return renderer, renderer.media_type
@@ -1,7 +1,80 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPagination(CursorPagination):
+    """Пагинация по курсору: без COUNT(*) и OFFSET на глубоких страницах.
+    Пустой ?cursor= означает первую страницу."""
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    ordering = ('-id',)
+
+    def decode_cursor(self, request):
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+
+class FeedPagination(KeysetPagination):
+    """Курсор ленты — id последнего показанного рецепта. Страницу
+    отдаёт функция fetch(before, limit), а не фильтр queryset."""
+
+    def paginate_feed(self, fetch, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        try:
+            before = int(cursor.position) if cursor else None
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        ids = fetch(before, self.page_size + 1)
+        self.has_next = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+        self.next_position = ids[-1] if ids else None
+        return ids
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=str(self.next_position)))
+
+    def get_previous_link(self):
+        # Лента листается только вперёд.
+        return None
 
 
 class LimitPagePagination(PageNumberPagination):
     page_size = 6
     page_query_param = 'page'
     page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    cursor_ordering = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (self.cursor_ordering
+                and KeysetPagination.cursor_query_param
+                in request.query_params):
+            self.keyset = KeysetPagination()
+            self.keyset.ordering = self.cursor_ordering
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(LimitPagePagination):
+    cursor_ordering = ('-pub_date', '-id')
+
+
+class SubscriptionPagination(LimitPagePagination):
+    cursor_ordering = ('-id',)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 
@@ -20,3 +21,11 @@ class AdminOrAuthor(BasePermission):
     def has_object_permission(self, request, view, obj):
         return (request.method in SAFE_METHODS
                 or request.user == obj.author or request.user.is_superuser)
+
+
+class MetricsAccess(BasePermission):
+    """Пермишн для сборщика метрик: доверенные адреса и персонал."""
+    def has_permission(self, request, view):
+        return (request.META.get('REMOTE_ADDR')
+                in settings.METRICS_ALLOWED_IPS
+                or request.user and request.user.is_staff)
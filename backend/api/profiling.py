@@ -0,0 +1,107 @@
+"""Профилирование отдельных запросов по запросу персонала.
+
+Запрос профилируется, если передан заголовок X-Profile или параметр
+?profile= со значением cpu (только cProfile) или memory (ещё и
+tracemalloc). Отчёты пишутся в PROFILER_DIR: .prof для pstats и .txt
+с самыми горячими функциями и местами выделения памяти.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+MODES = ('cpu', 'memory')
+RATE_KEY = 'profiler:rate:{}'
+
+
+def requested_mode(request):
+    mode = (request.headers.get('X-Profile')
+            or request.GET.get('profile', '')).lower()
+    if mode in ('1', 'true'):
+        return 'cpu'
+    return mode if mode in MODES else None
+
+
+def is_staff(request):
+    """Аутентифицирует запрос так же, как это сделает DRF."""
+    drf_request = Request(request, authenticators=[
+        authenticator() for authenticator
+        in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    try:
+        return drf_request.user.is_staff
+    except Exception:
+        return False
+
+
+def take_slot():
+    """Ограничивает число профилей в минуту на все процессы."""
+    key = RATE_KEY.format(int(time.time() // 60))
+    cache.add(key, 0, timeout=120)
+    try:
+        return cache.incr(key) <= settings.PROFILER_MAX_PER_MINUTE
+    except ValueError:
+        return False
+
+
+def should_profile(request):
+    if not settings.PROFILER_DIR:
+        return None
+    mode = requested_mode(request)
+    if (mode is None
+            or random.random() >= settings.PROFILER_SAMPLE_RATE
+            or not is_staff(request)
+            or not take_slot()):
+        return None
+    return mode
+
+
+def profile_request(get_response, request, mode):
+    """Выполняет запрос под профилировщиком и сохраняет отчёт."""
+    profiler = cProfile.Profile()
+    if mode == 'memory':
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        response = profiler.runcall(get_response, request)
+    finally:
+        duration = time.perf_counter() - started
+        if mode == 'memory':
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    name = report_name(request)
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILER_DIR, name)
+    profiler.dump_stats(f'{path}.prof')
+
+    report = io.StringIO()
+    report.write(f'{request.method} {request.get_full_path()}\n'
+                 f'status {response.status_code}, '
+                 f'{duration * 1000:.1f} ms\n\n')
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats('cumulative').print_stats(40)
+    if mode == 'memory':
+        report.write(f'Пик памяти: {peak / 1024:.1f} KiB\n\n')
+        for stat in snapshot.statistics('lineno')[:25]:
+            report.write(f'{stat}\n')
+    with open(f'{path}.txt', 'w', encoding='utf-8') as f:
+        f.write(report.getvalue())
+    response['X-Profile-Id'] = name
+    return response
+
+
+def report_name(request):
+    path = re.sub(r'[^\w]+', '-', request.path).strip('-') or 'root'
+    return (f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}-'
+            f'{request.method.lower()}-{path[:80]}')
@@ -0,0 +1,33 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON через orjson, если он установлен. Вывод совпадает
+    с JSONRenderer: компактный UTF-8, U+2028 и U+2029 экранированы,
+    datetime, Decimal и ленивые строки — через кодировщик DRF.
+    С отступом из Accept и без orjson работает как JSONRenderer."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {})):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            content = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # Например, целые больше 64 бит.
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        if b'\xe2\x80' in content:
+            content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+                b'\xe2\x80\xa9', b'\\u2029')
+        return content
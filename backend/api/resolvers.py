@@ -0,0 +1,58 @@
+from django.db.models import Manager
+from rest_framework.serializers import ListSerializer
+
+from users.models import Subscription
+from .metrics import SerializeTimerMixin
+
+
+class SubscriptionResolver:
+    """Определяет подписки пользователя на авторов одним запросом
+    для всей страницы и отвечает на is_subscribed из памяти."""
+
+    def __init__(self, user):
+        self.user = user
+        self._subscribed = {}
+
+    @classmethod
+    def for_request(cls, request):
+        resolver = getattr(request, '_subscription_resolver', None)
+        if resolver is None:
+            resolver = cls(request.user)
+            request._subscription_resolver = resolver
+        return resolver
+
+    def prime(self, author_ids):
+        if not self.user.is_authenticated:
+            return
+        missing = set(author_ids) - self._subscribed.keys()
+        if not missing:
+            return
+        subscribed = set(Subscription.objects.filter(
+            user=self.user, author_id__in=missing
+        ).values_list('author_id', flat=True))
+        for author_id in missing:
+            self._subscribed[author_id] = author_id in subscribed
+
+    def is_subscribed(self, author_id):
+        if not self.user.is_authenticated:
+            return False
+        if author_id not in self._subscribed:
+            self.prime([author_id])
+        return self._subscribed[author_id]
+
+
+class SubscriptionPrimingListSerializer(SerializeTimerMixin, ListSerializer):
+    """Список, заранее загружающий подписки на авторов своих элементов,
+    если поле subscribed_field есть в ответе."""
+    author_attr = 'pk'
+    subscribed_field = 'is_subscribed'
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, Manager) else data
+        request = self.context.get('request')
+        if (request is not None
+                and self.subscribed_field in self.child.fields):
+            items = list(items)
+            SubscriptionResolver.for_request(request).prime(
+                getattr(item, self.author_attr) for item in items)
+        return super().to_representation(items)
@@ -0,0 +1,58 @@
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from recipes.versions import RECIPES_VERSION_KEY, get_version
+from .conditional import query_string
+
+STATS_KEYS = {
+    'hits': 'response_cache:hits',
+    'misses': 'response_cache:misses',
+}
+
+
+def response_key(request):
+    return 'response_cache:{}:{}{}?{}'.format(
+        get_version(RECIPES_VERSION_KEY), request.get_host(), request.path,
+        query_string(request))
+
+
+def record(stat):
+    key = STATS_KEYS[stat]
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_stats():
+    return {stat: cache.get(key, 0) for stat, key in STATS_KEYS.items()}
+
+
+def cache_anonymous_response(view_method):
+    """Отдаёт анонимным пользователям закэшированный JSON ответа.
+    Ключ включает версию рецептов, общую для всех воркеров, поэтому
+    любая запись в рецепты делает старые ответы недоступными."""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if (request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return view_method(self, request, *args, **kwargs)
+        key = response_key(request)
+        content = cache.get(key)
+        if content is not None:
+            record('hits')
+            response = HttpResponse(content,
+                                    content_type='application/json')
+            response['X-Cache'] = 'HIT'
+            return response
+        record('misses')
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            response.add_post_render_callback(
+                lambda rendered: cache.set(key, rendered.content))
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
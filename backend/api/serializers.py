@@ -1,17 +1,48 @@
-from django.db.models import F
-from django.shortcuts import get_object_or_404
+from collections import OrderedDict
+
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework.serializers import (CharField, EmailField,
-                                        IntegerField, ModelSerializer,
-                                        PrimaryKeyRelatedField, ReadOnlyField,
-                                        SerializerMethodField, ValidationError)
+                                        IntegerField, ListField,
+                                        ListSerializer, ModelSerializer,
+                                        ReadOnlyField, Serializer,
+                                        SerializerMethodField,
+                                        ValidationError)
 from rest_framework.validators import UniqueValidator
 
-from users.models import Subscription, User
+from users.models import User
+from recipes.catalog import get_catalog
 from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
                             ShoppingCart, Tag)
-from .fields import RecipeSubscribeUserField
+from recipes.shopping_cart import recipe_ingredients_changed, recipe_vectors
+from recipes.signals import bulk_operation
+from recipes.versions import invalidate_recipes
+from .fields import (RecipeImageField, RecipeSubscribeUserField,
+                     get_sparse_fields)
+from .metrics import SerializeTimerMixin
+from .resolvers import SubscriptionPrimingListSerializer, SubscriptionResolver
+
+MAX_BULK_RECIPES = 100
+
+
+class TimedListSerializer(SerializeTimerMixin, ListSerializer):
+    pass
+
+
+class SparseFieldsMixin:
+    """Отдаёт только поля из ?fields= без полей из ?omit=. Действует
+    на сериализатор ответа, вложенные сериализаторы отдаются целиком."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self
+        if isinstance(self.parent, ListSerializer):
+            root = self.parent
+        if root.parent is None:
+            names = get_sparse_fields(self.context.get('request'), fields)
+            if names is not None:
+                fields = OrderedDict((name, fields[name]) for name in names)
+        return fields
 
 
 class CreateUserSerializer(UserCreateSerializer):
@@ -29,7 +60,12 @@ class CreateUserSerializer(UserCreateSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
 
-class UsersSerializer(UserSerializer):
+class UsersListSerializer(SubscriptionPrimingListSerializer):
+    author_attr = 'pk'
+
+
+class UsersSerializer(SerializeTimerMixin, SparseFieldsMixin,
+                      UserSerializer):
     is_subscribed = SerializerMethodField()
 
     class Meta:
@@ -37,26 +73,29 @@ class UsersSerializer(UserSerializer):
         fields = ('email', 'id', 'username',
                   'first_name', 'last_name',
                   'is_subscribed')
+        list_serializer_class = UsersListSerializer
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_authenticated:
-            return Subscription.objects.filter(user=user, author=obj).exists()
-        return False
+        request = self.context.get('request')
+        if request is None:
+            return False
+        return SubscriptionResolver.for_request(request).is_subscribed(obj.pk)
 
 
-class TagSerializer(ModelSerializer):
+class TagSerializer(SerializeTimerMixin, ModelSerializer):
 
     class Meta:
         model = Tag
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(ModelSerializer):
+class IngredientSerializer(SerializeTimerMixin, ModelSerializer):
 
     class Meta:
         model = Ingredient
         fields = '__all__'
+        list_serializer_class = TimedListSerializer
 
 
 class IngredientCreateSerializer(ModelSerializer):
@@ -86,20 +125,28 @@ class ReadIngredientsInRecipeSerializer(ModelSerializer):
         representation['amount'] = instance.amount
         return representation
 
-class RecipeSerializer(ModelSerializer):
+
+class RecipeListSerializer(SubscriptionPrimingListSerializer):
+    author_attr = 'author_id'
+    subscribed_field = 'author'
+
+
+class RecipeSerializer(SerializeTimerMixin, SparseFieldsMixin,
+                       ModelSerializer):
 
     author = UsersSerializer(read_only=True)
     ingredients = ReadIngredientsInRecipeSerializer(source='amount_ingredient', many=True)
     tags = TagSerializer(many=True)
     is_in_shopping_cart = SerializerMethodField()
     is_favorited = SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time')
+        list_serializer_class = RecipeListSerializer
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
@@ -111,6 +158,8 @@ class RecipeSerializer(ModelSerializer):
         return recipe
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_authenticated:
             return ShoppingCart.objects.filter(
@@ -118,6 +167,8 @@ class RecipeSerializer(ModelSerializer):
         return False
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             user = request.user
@@ -126,12 +177,11 @@ class RecipeSerializer(ModelSerializer):
         return False
 
 
-class RecipeCreateSerializer(ModelSerializer):
+class RecipeCreateSerializer(SerializeTimerMixin, ModelSerializer):
 
     ingredients = IngredientCreateSerializer(many=True)
-    tags = PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                  many=True)
-    image = Base64ImageField()
+    tags = ListField(child=IntegerField())
+    image = RecipeImageField()
     name = CharField(max_length=200)
     cooking_time = IntegerField()
     author = UserSerializer(read_only=True)
@@ -142,92 +192,127 @@ class RecipeCreateSerializer(ModelSerializer):
                   'image', 'name', 'text',
                   'cooking_time', 'author')
 
-    # @staticmethod
-    # def create_ingredients(ingredients, recipe):
-    #     print("Create ingredients: ", ingredients)
-    #     for ingredient in ingredients:
-    #         amount = ingredient['amount']
-    #         if AmountIngredient.objects.filter(
-    #                 recipe=recipe,
-    #                 ingredients=get_object_or_404(
-    #                     Ingredient, id=ingredient['id'])).exists():
-    #             amount += F('amount')
-    #         AmountIngredient.objects.update_or_create(
-    #             recipe=recipe,
-    #             ingredients=get_object_or_404(
-    #                 Ingredient, id=ingredient['id']),
-    #             defaults={'amount': amount})
-
+    @staticmethod
+    def create_tags(tags, recipe):
+        RecipeTag = Recipe.tags.through
+        RecipeTag.objects.bulk_create(
+            [RecipeTag(recipe=recipe, tag_id=tag) for tag in tags])
+
+    @staticmethod
+    def create_ingredients(ingredients, recipe):
+        AmountIngredient.objects.bulk_create(
+            [AmountIngredient(recipe=recipe,
+                              ingredients_id=ingredient['id'],
+                              amount=ingredient['amount'])
+             for ingredient in ingredients])
+
+    @staticmethod
+    def update_tags(tags, recipe):
+        RecipeTag = Recipe.tags.through
+        existing = set(RecipeTag.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        removed = existing - set(tags)
+        if removed:
+            RecipeTag.objects.filter(recipe=recipe,
+                                     tag_id__in=removed).delete()
+        RecipeCreateSerializer.create_tags(
+            [tag for tag in tags if tag not in existing], recipe)
+
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        """Приводит ингредиенты рецепта к новому списку минимальным
+        числом вставок, обновлений и удалений. Возвращает True,
+        если что-то изменилось."""
+        existing = {amount.ingredients_id: amount
+                    for amount in recipe.amount_ingredient.all()}
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        removed = existing.keys() - amounts.keys()
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            row = existing.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if removed:
+            # Списки покупок обновляет update() приращением.
+            with bulk_operation():
+                AmountIngredient.objects.filter(
+                    recipe=recipe, ingredients_id__in=removed).delete()
+        if changed:
+            AmountIngredient.objects.bulk_update(changed, ['amount'])
+        added = [item for item in ingredients if item['id'] not in existing]
+        RecipeCreateSerializer.create_ingredients(added, recipe)
+        return bool(removed or changed or added)
+
+    @transaction.atomic
     def create(self, validated_data):
-        tags_data = validated_data.pop('tags')
-        ingredients_data = validated_data.pop('ingredients')
-        image = validated_data.pop('image')
-        recipe = Recipe.objects.create(image=image,
-                                       **validated_data)
-        # self.create_ingredients(ingredients_data, recipe)
-
-        recipe.tags.set(tags_data)
-        ingredients_list = [
-            AmountIngredient(
-                recipe=recipe,
-                ingredients=get_object_or_404(Ingredient, id=ingredient['id']),
-                amount=ingredient.get('amount')
-            )
-            for ingredient in ingredients_data
-        ]
-        AmountIngredient.objects.bulk_create(ingredients_list)
-
+        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('ingredients')
+        recipe = Recipe.objects.create(**validated_data)
+        self.create_tags(tags, recipe)
+        self.create_ingredients(ingredients, recipe)
+        transaction.on_commit(invalidate_recipes)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        AmountIngredient.objects.filter(recipe=recipe).delete()
-        self.create_ingredients(ingredients, recipe)
-        recipe.tags.set(tags)
-        return super().update(recipe, validated_data)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        # Блокировка рецепта упорядочивает правку с добавлением его
+        # в корзины (recipes.user_lists.lock): old_vector и список тех,
+        # у кого рецепт в корзине, читаются уже после их коммита.
+        list(Recipe.objects.select_for_update().filter(
+            pk=recipe.pk).values_list('pk', flat=True))
+        recipe = super().update(recipe, validated_data)
+        if tags is not None:
+            self.update_tags(tags, recipe)
+        if ingredients is not None:
+            old_vector = recipe_vectors([recipe.pk]).get(recipe.pk, {})
+            if self.update_ingredients(ingredients, recipe):
+                recipe_ingredients_changed(recipe.pk, old_vector)
+        transaction.on_commit(invalidate_recipes)
+        return recipe
 
     def to_representation(self, recipe):
-        data = RecipeSerializer(
-            recipe,
-            context={'request': self.context.get('request')}).data
-        return data
-
-    def validate_ingredients(self, data):
-        ingredient_data = self.initial_data.get('ingredients')
-        if ingredient_data:
-            checked_ingredients = set()
-            for ingredient in ingredient_data:
-                ingredient_obj = get_object_or_404(
-                    Ingredient, id=ingredient['id']
-                )
-                if ingredient_obj in checked_ingredients:
-                    raise ValidationError('дубликат ингредиента')
-                checked_ingredients.add(ingredient_obj)
-        return ingredient_data
+        request = self.context.get('request')
+        recipe = Recipe.objects.with_related().with_user_flags(
+            request.user).get(pk=recipe.pk)
+        return RecipeSerializer(recipe, context={'request': request}).data
+
+    def validate_ingredients(self, ingredients):
+        if not ingredients:
+            raise ValidationError('Нужен хотя бы один ингредиент')
+        ids = [ingredient['id'] for ingredient in ingredients]
+        if len(ids) != len(set(ids)):
+            raise ValidationError('дубликат ингредиента')
+        missing = set(ids) - get_catalog().in_bulk(ids).keys()
+        if missing:
+            missing -= Ingredient.objects.in_bulk(missing).keys()
+        if missing:
+            raise ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}')
+        return ingredients
+
+    def validate_tags(self, tags):
+        if not tags:
+            raise ValidationError('Нужен хотя бы один тэг')
+        if len(tags) != len(set(tags)):
+            raise ValidationError('дубликат тэга')
+        missing = set(tags) - Tag.objects.in_bulk(tags).keys()
+        if missing:
+            raise ValidationError(f'Тэги не найдены: {sorted(missing)}')
+        return tags
 
     def validate_cooking_time(self, cooking_time):
         if cooking_time <= 0:
             raise ValidationError('Время приготовления должно быть больше 0')
         return cooking_time
 
-    # def validate_ingredients(self, ingredients):
-    #     print("Ingredients in validation: ", ingredients)
-    #     raise NotImplementedError
-    #     ingredients_ids = [ingredient.get('id') for ingredient in ingredients]
-
-    #     for ingredient in ingredients:
-    #         if int(ingredient['amount']) <= 0:
-    #             raise ValidationError(
-    #                 'Количество ингредиентов должно быть больше 0')
 
-    #     if len(ingredients_ids) != len(set(ingredients_ids)):
-    #         raise ValidationError('Список ингредиентов содержит дубликаты')
+class RecipeForSubscriptionersSerializer(SerializeTimerMixin,
+                                         ModelSerializer):
 
-    #     return ingredients
-
-
-class RecipeForSubscriptionersSerializer(ModelSerializer):
+    image = RecipeImageField(variant='card', read_only=True)
 
     class Meta:
         model = Recipe
@@ -235,7 +320,14 @@ class RecipeForSubscriptionersSerializer(ModelSerializer):
                   'image', 'cooking_time')
 
 
-class SubscriptionSerializer(ModelSerializer):
+class RecipeIdsSerializer(Serializer):
+    """Список рецептов для пакетных операций с избранным и корзиной."""
+    recipes = ListField(child=IntegerField(min_value=1), allow_empty=False,
+                        max_length=MAX_BULK_RECIPES)
+
+
+class SubscriptionSerializer(SerializeTimerMixin, SparseFieldsMixin,
+                             ModelSerializer):
     """Сериализатор для подписок."""
     recipes = RecipeSubscribeUserField()
     recipes_count = SerializerMethodField(read_only=True)
@@ -252,10 +344,10 @@ class SubscriptionSerializer(ModelSerializer):
                   'first_name', 'last_name',
                   'is_subscribed',
                   'recipes', 'recipes_count')
+        list_serializer_class = TimedListSerializer
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
 
     def get_is_subscribed(self, obj):
-        return Subscription.objects.filter(user=obj.user,
-                                           author=obj.author).exists()
+        return obj.pk is not None
@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+from contextlib import contextmanager
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import benchmarks
+from recipes import catalog, pantry
+
+
+class SeededTestCase(TestCase):
+    """Тесты на данных benchmarks.seed с картинками во временном
+    MEDIA_ROOT; фоновые пулы выполняют работу сразу."""
+    seed_options = {'users': 10, 'recipes': 60, 'ingredients': 30,
+                    'favorites': 5, 'subscriptions': 3}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root, IMAGE_VARIANT_WORKERS=0,
+            FEED_FANOUT_WORKERS=0)
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors, cls.tags, cls.catalog, cls.recipes = benchmarks.seed(
+            **cls.seed_options)
+        cls.user = cls.authors[0]
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+@contextmanager
+def other_process():
+    """Внутри блока данные меняются так, как их менял бы другой воркер:
+    у него своя копия кэша в памяти процесса, а копии каталога
+    и индекса этого процесса после блока остаются прежними."""
+    with mock.patch('recipes.versions.cache', LocMemCache('other', {})), \
+            mock.patch.object(catalog, '_catalog', catalog._catalog), \
+            mock.patch.object(pantry, '_index', pantry._index):
+        yield
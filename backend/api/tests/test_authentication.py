@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.models import User
+from users.tokens import token_cache_key
+
+PASSWORD = 'Secret-pass-42'
+
+
+class TokenRevocationTest(TestCase):
+    """Закэшированный токен не проверяется по базе, а отозванный
+    перестаёт работать на следующем же запросе."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cls.cache_dir,
+        }})
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password=PASSWORD,
+            first_name='Иван', last_name='Поваров')
+
+    def setUp(self):
+        cache.clear()
+        response = APIClient().post('/api/auth/token/login/', {
+            'email': self.user.email, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 200)
+        self.token = response.data['auth_token']
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.assertIsNotNone(cache.get(token_cache_key(self.token)))
+
+    def test_logout(self):
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_deactivation(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_password_change(self):
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': PASSWORD,
+            'new_password': 'Another-pass-43'})
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(cache.get(token_cache_key(self.token)))
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.assertIsNotNone(cache.get(token_cache_key(self.token)))
+
+    def test_cached_token_not_queried(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries
+                          if Token._meta.db_table in query['sql']])
+
+    def test_process_local_cache_not_used(self):
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}):
+            self.assertEqual(
+                self.client.get('/api/users/me/').status_code, 200)
+            self.assertIsNone(cache.get(token_cache_key(self.token)))
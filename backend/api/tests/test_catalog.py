@@ -0,0 +1,17 @@
+from django.test import TestCase
+
+from recipes.catalog import get_catalog
+from recipes.models import Ingredient
+from .base import other_process
+
+
+class CatalogTest(TestCase):
+    """Каталог ингредиентов процесса видит изменения других процессов."""
+
+    def test_change_in_other_process(self):
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.assertEqual(get_catalog().search('со'), [salt])
+        with other_process():
+            sugar = Ingredient.objects.create(name='сода',
+                                              measurement_unit='г')
+        self.assertEqual(get_catalog().search('со'), [sugar, salt])
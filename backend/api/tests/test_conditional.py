@@ -0,0 +1,30 @@
+from recipes.models import Ingredient
+from .base import SeededTestCase, other_process
+
+
+class ConditionalTest(SeededTestCase):
+    """ETag зависит от всех параметров запроса и от изменений,
+    сделанных в других процессах."""
+
+    url = '/api/ingredients/'
+
+    def test_query_params(self):
+        first = self.anonymous.get(self.url, {'name': 'а'})['ETag']
+        second = self.anonymous.get(self.url, {'name': 'б'})['ETag']
+        self.assertNotEqual(first, second)
+        self.assertEqual(
+            self.anonymous.get(self.url, {'name': 'б'},
+                               HTTP_IF_NONE_MATCH=first).status_code,
+            200)
+
+    def test_change_in_other_process(self):
+        etag = self.anonymous.get(self.url, {'name': 'а'})['ETag']
+        response = self.anonymous.get(self.url, {'name': 'а'},
+                                      HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with other_process():
+            Ingredient.objects.create(name='абрикос', measurement_unit='г')
+        response = self.anonymous.get(self.url, {'name': 'а'},
+                                      HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,38 @@
+import random
+from io import StringIO
+
+from django.core.management import call_command
+
+from api import benchmarks
+from recipes.models import FeedFanout, FeedItem, Recipe
+from users.models import Subscription
+from .base import SeededTestCase
+
+
+class FeedFanoutTest(SeededTestCase):
+    """Раскладка нового рецепта по лентам и её восстановление."""
+
+    def test_fan_out_on_create(self):
+        follower = Subscription.objects.filter(author=self.user).first().user
+        payload = benchmarks.recipe_payload(
+            self.tags, self.catalog, random.Random(0), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', payload,
+                                        format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe_id = response.data['id']
+        self.assertTrue(FeedItem.objects.filter(
+            user=follower, recipe_id=recipe_id).exists())
+        self.assertFalse(FeedFanout.objects.exists())
+
+    def test_drain_interrupted_fan_out(self):
+        recipe = Recipe.objects.filter(author=self.user).first()
+        FeedItem.objects.filter(recipe=recipe).delete()
+        FeedFanout.objects.create(recipe=recipe)
+        call_command('drain_feed_fanouts', min_age=0, stdout=StringIO())
+        followers = Subscription.objects.filter(
+            author=self.user).values_list('user_id', flat=True)
+        self.assertCountEqual(
+            FeedItem.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True), followers)
+        self.assertFalse(FeedFanout.objects.exists())
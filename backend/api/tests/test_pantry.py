@@ -0,0 +1,25 @@
+from recipes.models import AmountIngredient, Recipe
+from .base import SeededTestCase, other_process
+
+
+class PantryTest(SeededTestCase):
+    """Индекс подбора рецептов видит рецепты, изменённые в другом
+    процессе."""
+
+    def cook(self, ingredient):
+        response = self.client.get('/api/recipes/cook/',
+                                   {'ingredients': ingredient.pk})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_change_in_other_process(self):
+        ingredient = self.catalog[0]
+        self.cook(ingredient)
+        with other_process(), self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.user, name='новый', text='новый',
+                cooking_time=1)
+            AmountIngredient.objects.create(
+                recipe=recipe, ingredients=ingredient, amount=1)
+            recipe.save()
+        self.assertEqual(self.cook(ingredient)[0], recipe.pk)
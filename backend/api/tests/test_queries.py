@@ -0,0 +1,25 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import SeededTestCase
+
+
+class RecipeListQueriesTest(SeededTestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    def assert_constant_queries(self, client):
+        # Первый запрос заводит метки версий.
+        client.get('/api/recipes/?limit=1')
+        with CaptureQueriesContext(connection) as small:
+            response = client.get('/api/recipes/?limit=6')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        with self.assertNumQueries(len(small)):
+            response = client.get('/api/recipes/?limit=50')
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_anonymous(self):
+        self.assert_constant_queries(self.anonymous)
+
+    def test_authenticated(self):
+        self.assert_constant_queries(self.client)
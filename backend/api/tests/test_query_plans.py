@@ -0,0 +1,22 @@
+from unittest import skipUnless
+
+from django.db import connection
+
+from api import benchmarks
+from .base import SeededTestCase
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN SQLite')
+class QueryPlansTest(SeededTestCase):
+    """Сценарии benchmarks используют ожидаемые индексы
+    и не просматривают большие таблицы целиком."""
+
+    def test_scenarios(self):
+        scenarios = benchmarks.scenarios(
+            self.authors, self.tags, self.catalog, self.recipes,
+            ingredients_per_recipe=8)
+        for name, call in scenarios.items():
+            with self.subTest(name):
+                plans = benchmarks.explain(call)
+                self.assertTrue(plans)
+                self.assertEqual(benchmarks.check_plans(name, plans), [])
@@ -0,0 +1,38 @@
+import random
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase
+
+from recipes import recommendations
+from recipes.recommendations import InteractionMatrix
+
+
+def make_matrix(pairs):
+    matrix = InteractionMatrix()
+    for user_id, recipe_id in pairs:
+        matrix.users_by_recipe[recipe_id].add(user_id)
+        matrix.recipes_by_user[user_id].add(recipe_id)
+    return matrix
+
+
+@mock.patch.object(recommendations, 'MAX_USER_ITEMS', 5)
+class InteractionMatrixTest(SimpleTestCase):
+    """Пользователи с огромной историей не влияют на сходство."""
+
+    def test_heavy_users_excluded_from_norms(self):
+        heavy = [(2, recipe_id) for recipe_id in range(1, 10)]
+        matrix = make_matrix([(1, 1), (1, 2)] + heavy)
+        self.assertEqual(matrix.neighbors(1), [(2, 1.0)])
+        self.assertEqual(matrix.neighbors(3), [])
+
+    @skipIf(recommendations.sparse is None, 'scipy не установлен')
+    def test_sparse_matches_python(self):
+        rng = random.Random(0)
+        matrix = make_matrix(
+            (user_id, recipe_id) for user_id in range(100)
+            for recipe_id in rng.sample(range(60), rng.randint(1, 8)))
+        recipe_ids = list(matrix.users_by_recipe)
+        self.assertEqual(
+            matrix.neighbors_many(recipe_ids, 5),
+            {recipe_id: matrix.neighbors(recipe_id, 5)
+             for recipe_id in recipe_ids})
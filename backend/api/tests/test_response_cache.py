@@ -0,0 +1,20 @@
+from recipes.models import Recipe
+from .base import SeededTestCase, other_process
+
+
+class ResponseCacheTest(SeededTestCase):
+    """Кэш ответов для анонимных пользователей сбрасывается записью
+    в рецепты, сделанной в другом процессе."""
+
+    def test_write_in_other_process(self):
+        url = '/api/recipes/?limit=6'
+        self.assertEqual(self.anonymous.get(url)['X-Cache'], 'MISS')
+        response = self.anonymous.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        recipe_id = response.json()['results'][0]['id']
+        with other_process():
+            Recipe.objects.filter(pk=recipe_id).delete()
+        response = self.anonymous.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotIn(recipe_id, [recipe['id'] for recipe
+                                     in response.json()['results']])
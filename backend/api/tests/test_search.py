@@ -0,0 +1,15 @@
+from .base import SeededTestCase
+
+
+class SearchTest(SeededTestCase):
+    """Результаты поиска листаются только по страницам: курсор
+    потерял бы порядок по релевантности."""
+
+    def test_cursor_rejected(self):
+        params = {'search': 'рецепт 1', 'limit': 3}
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/recipes/',
+                                   dict(params, cursor=''))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
@@ -0,0 +1,67 @@
+import random
+
+from rest_framework.test import APIClient
+
+from api import benchmarks
+from recipes.models import ShoppingListItem
+from recipes.shopping_cart import rebuild_lists
+from .base import SeededTestCase
+
+
+class ShoppingListTest(SeededTestCase):
+    """Список покупок, который API меняет приращениями, совпадает
+    с пересчитанным с нуля."""
+
+    @staticmethod
+    def snapshot():
+        return list(ShoppingListItem.objects.order_by(
+            'user_id', 'name', 'measurement_unit').values_list(
+            'user_id', 'name', 'measurement_unit', 'amount', 'entries'))
+
+    def assert_matches_rebuild(self):
+        incremental = self.snapshot()
+        rebuild_lists()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_add_edit_remove(self):
+        recipe, *others = self.recipes[:5]
+        recipe.author = self.user
+        recipe.save()
+        other = APIClient()
+        other.force_authenticate(self.authors[1])
+        ids = [item.pk for item in others]
+
+        self.client.post('/api/recipes/shopping_cart/',
+                         {'recipes': [recipe.pk] + ids}, format='json')
+        other.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assert_matches_rebuild()
+
+        self.client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.client.post('/api/recipes/shopping_cart/',
+                         {'recipes': ids}, format='json')
+        self.assert_matches_rebuild()
+
+        amounts = list(recipe.amount_ingredient.values_list(
+            'ingredients_id', 'amount'))
+        kept = [{'id': pk, 'amount': amount + 7}
+                for pk, amount in amounts[1:]]
+        used = {pk for pk, _ in amounts}
+        added = [{'id': ingredient.pk, 'amount': 3}
+                 for ingredient in self.catalog
+                 if ingredient.pk not in used][:2]
+        payload = benchmarks.recipe_payload(
+            self.tags, self.catalog, random.Random(0), 1)
+        payload['ingredients'] = kept + added
+        response = self.client.put(f'/api/recipes/{recipe.pk}/', payload,
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_matches_rebuild()
+
+        self.client.delete('/api/recipes/shopping_cart/',
+                           {'recipes': ids[:2]}, format='json')
+        other.delete(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assert_matches_rebuild()
+
+        self.client.delete('/api/recipes/shopping_cart/',
+                           {'recipes': [recipe.pk] + ids}, format='json')
+        self.assert_matches_rebuild()
@@ -0,0 +1,31 @@
+from recipes.models import Favorite, Recipe
+from .base import SeededTestCase
+
+
+class FavoriteTest(SeededTestCase):
+    """Повторное добавление не создаёт строк и не меняет счётчики."""
+
+    def test_add_twice(self):
+        recipe = Recipe.objects.exclude(favorite__user=self.user).first()
+        count = recipe.favorites_count
+        for _ in range(2):
+            response = self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+            self.assertEqual(response.status_code, 201)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, count + 1)
+        self.assertEqual(Favorite.objects.filter(
+            user=self.user, recipe=recipe).count(), 1)
+
+    def test_bulk_statuses(self):
+        present = Favorite.objects.filter(user=self.user).first().recipe_id
+        new = Recipe.objects.exclude(favorite__user=self.user).first().pk
+        missing = Recipe.objects.order_by('-pk').first().pk + 1
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            {'recipes': [present, new, missing, new]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'id': present, 'status': 'exists'},
+            {'id': new, 'status': 'added'},
+            {'id': missing, 'status': 'not_found'},
+        ])
@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UsersViewSet
+from .views import (IngredientViewSet, RecipeViewSet, TagViewSet,
+                    UsersViewSet, metrics)
 
 app_name = 'api'
 
@@ -15,5 +16,6 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('metrics/', metrics, name='metrics'),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,25 +1,70 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import F, OuterRef, Prefetch, Q, Subquery, Sum
+from django.http import HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import filters, permissions, status, viewsets
-from rest_framework.decorators import action
+from rest_framework.decorators import (action, api_view,
+                                       permission_classes)
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
 
 from users.models import Subscription, User
-from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
-                            ShoppingCart, Tag)
-from .filters import IngredientSearchFilter, RecipesFilter
-from .pagination import LimitPagePagination
-from .permissions import AdminOrAuthor
+from recipes.catalog import CATALOG_VERSION_KEY, get_catalog
+from recipes.feed import get_feed
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.pantry import get_index as get_pantry_index
+from recipes.shopping_cart import get_shopping_list
+from recipes.user_lists import add_recipe, add_recipes, remove_recipes
+from recipes.versions import (RECIPES_VERSION_KEY, TAGS_VERSION_KEY,
+                              user_state_version_key)
+from .conditional import conditional
+from .exporters import EXPORTERS
+from .fields import get_recipes_limit, get_sparse_fields
+from .filters import RecipesFilter
+from .metrics import registry, render_prometheus
+from .negotiation import IgnoreFormatContentNegotiation
+from .pagination import (FeedPagination, LimitPagePagination,
+                         RecipePagination, SubscriptionPagination)
+from .permissions import AdminOrAuthor, MetricsAccess
+from .response_cache import cache_anonymous_response
+from .response_cache import get_stats as get_response_cache_stats
 from .serializers import (IngredientSerializer, RecipeCreateSerializer,
-                          RecipeForSubscriptionersSerializer, RecipeSerializer,
+                          RecipeForSubscriptionersSerializer,
+                          RecipeIdsSerializer, RecipeSerializer,
                           SubscriptionSerializer, TagSerializer,
                           UsersSerializer)
 
 
+LOOKUP_MAX_AGE = 60
+MAX_PANTRY_INGREDIENTS = 100
+
+
+def get_ingredient_ids(request):
+    """Id ингредиентов из ?ingredients=1,2 или повторённого параметра."""
+    try:
+        ids = {int(value)
+               for values in request.query_params.getlist('ingredients')
+               for value in values.split(',') if value.strip()}
+    except ValueError:
+        raise ValidationError(
+            {'ingredients': 'Ожидаются целые id ингредиентов'})
+    if not ids:
+        raise ValidationError({'ingredients': 'Укажите ингредиенты'})
+    if len(ids) > MAX_PANTRY_INGREDIENTS:
+        raise ValidationError({'ingredients': (
+            f'Не больше {MAX_PANTRY_INGREDIENTS} ингредиентов')})
+    return ids
+
+
+def recipe_version_keys(request):
+    if request.user.is_authenticated:
+        return (RECIPES_VERSION_KEY, user_state_version_key(request.user.pk))
+    return (RECIPES_VERSION_KEY,)
+
+
 class UsersViewSet(UserViewSet):
     """Вьюсет для модели пользователей."""
     queryset = User.objects.all()
@@ -36,7 +81,8 @@ class UsersViewSet(UserViewSet):
                             status=status.HTTP_400_BAD_REQUEST)
         subscription = Subscription.objects.get_or_create(user=self.request.user,
                                               author=Subscriptioner)
-        serializer = SubscriptionSerializer(subscription[0])
+        serializer = SubscriptionSerializer(
+            subscription[0], context={'request': self.request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def unsubscribed(self, serializer, id=None):
@@ -54,11 +100,27 @@ class UsersViewSet(UserViewSet):
         return self.subscribed(serializer, id)
 
     @action(detail=False, methods=['get'],
-            permission_classes=[permissions.IsAuthenticated])
+            permission_classes=[permissions.IsAuthenticated],
+            pagination_class=SubscriptionPagination)
     def subscriptions(self, serializer):
-        Subscriptioning = Subscription.objects.filter(user=self.request.user)
+        recipes = Recipe.objects.all()
+        limit = get_recipes_limit(self.request)
+        if limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author_id'))
+                .values('pk')[:limit]))
+        Subscriptioning = Subscription.objects.filter(
+            user=self.request.user
+        ).select_related('author').order_by('-id')
+        fields = get_sparse_fields(self.request,
+                                   SubscriptionSerializer.Meta.fields)
+        if fields is None or 'recipes' in fields:
+            Subscriptioning = Subscriptioning.prefetch_related(
+                Prefetch('author__recipes', queryset=recipes,
+                         to_attr='limited_recipes'))
         pages = self.paginate_queryset(Subscriptioning)
-        serializer = SubscriptionSerializer(pages, many=True)
+        serializer = SubscriptionSerializer(
+            pages, many=True, context={'request': self.request})
         return self.get_paginated_response(serializer.data)
 
 
@@ -68,6 +130,14 @@ class TagViewSet(viewsets.ModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    @conditional(lambda request: (TAGS_VERSION_KEY,), max_age=LOOKUP_MAX_AGE)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(lambda request: (TAGS_VERSION_KEY,), max_age=LOOKUP_MAX_AGE)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             self.permission_classes = [AdminOrAuthor]
@@ -81,8 +151,20 @@ class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
+
+    @conditional(lambda request: (CATALOG_VERSION_KEY,),
+                 max_age=LOOKUP_MAX_AGE)
+    def list(self, request, *args, **kwargs):
+        catalog = get_catalog()
+        name = request.query_params.get('name')
+        ingredients = catalog.search(name) if name else catalog.all()
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
+    @conditional(lambda request: (CATALOG_VERSION_KEY,),
+                 max_age=LOOKUP_MAX_AGE)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -96,14 +178,113 @@ class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
     queryset = Recipe.objects.all()
     permission_classes = (AllowAny,)
-    pagination_class = LimitPagePagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipesFilter
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'cook', 'similar',
+                           'recommended', 'feed'):
+            fields = get_sparse_fields(self.request,
+                                       RecipeSerializer.Meta.fields)
+            queryset = queryset.with_related(fields).with_user_flags(
+                self.request.user, fields)
+        return queryset
+
+    @cache_anonymous_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(recipe_version_keys, per_user=True)
+    @cache_anonymous_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'],
+            pagination_class=LimitPagePagination)
+    def cook(self, request):
+        """Рецепты из имеющихся ингредиентов (?ingredients=1,2,3):
+        сначала те, для которых есть большая доля ингредиентов."""
+        ingredient_ids = get_ingredient_ids(request)
+        page = self.paginate_queryset(get_pantry_index().match(
+            ingredient_ids))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        page = [item for item in page if item[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page], many=True)
+        data = serializer.data
+        for item, (_, have, total) in zip(data, page):
+            item['matched_ingredients'] = have
+            item['total_ingredients'] = total
+        return self.get_paginated_response(data)
+
+    def paginated_response(self, queryset):
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'],
+            pagination_class=LimitPagePagination)
+    def similar(self, request, pk):
+        """Рецепты, которые часто добавляют в избранное и корзину
+        вместе с этим."""
+        return self.paginated_response(
+            self.get_queryset().filter(neighbor_of__recipe=pk).annotate(
+                similarity=F('neighbor_of__score')
+            ).order_by('-similarity', '-id'))
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            pagination_class=LimitPagePagination)
+    def recommended(self, request):
+        """Похожие на избранное и корзину пользователя рецепты, которых
+        у него ещё нет; без истории — самые популярные."""
+        queryset = self.get_queryset().filter(is_favorited=False,
+                                              is_in_shopping_cart=False)
+        favorites = Favorite.objects.filter(user=request.user)
+        cart = ShoppingCart.objects.filter(user=request.user)
+        own = (Q(neighbor_of__recipe__in=favorites.values('recipe'))
+               | Q(neighbor_of__recipe__in=cart.values('recipe')))
+        recommended = queryset.filter(own).annotate(
+            recommendation=Sum('neighbor_of__score')
+        ).order_by('-recommendation', '-id')
+        if not recommended.exists():
+            recommended = queryset.order_by('-favorites_count', '-pub_date',
+                                            '-id')
+        return self.paginated_response(recommended)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь."""
+        ids = self.paginator.paginate_feed(
+            lambda before, limit: get_feed(request.user.pk, before, limit),
+            request)
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(get_response_cache_stats())
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['image_variant'] = (
+            'card' if self.action in ('list', 'cook', 'similar',
+                                      'recommended', 'feed') else 'detail')
+        return context
 
     def get_serializer_class(self):
         if self.action == 'list':
             return RecipeSerializer
-        if self.action == 'retrieve':
+        if self.action in ('retrieve', 'cook', 'similar', 'recommended',
+                           'feed'):
             return RecipeSerializer
         return RecipeCreateSerializer
 
@@ -111,15 +292,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
     def add_to_favorite_or_shopping_cart(self, request, pk, model_class, success_message):
+        """Повторное добавление и удаление отсутствующего рецепта
+        не считаются ошибкой."""
         recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            model_class.objects.create(user=request.user, recipe=recipe)
+            add_recipe(model_class, request.user.pk, recipe.pk)
             serializer = RecipeForSubscriptionersSerializer(recipe)
             return Response(data=serializer.data, status=status.HTTP_201_CREATED)
-        deleted = get_object_or_404(model_class, user=request.user, recipe=recipe)
-        deleted.delete()
+        remove_recipes(model_class, request.user.pk, [recipe.pk])
         return Response({'message': success_message}, status=status.HTTP_200_OK)
 
+    def change_favorite_or_shopping_cart(self, request, model_class):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = add_recipes if request.method == 'POST' else remove_recipes
+        results = change(model_class, request.user.pk,
+                         serializer.validated_data['recipes'])
+        return Response({'results': [
+            {'id': recipe_id, 'status': result}
+            for recipe_id, result in results.items()
+        ]})
+
     @action(detail=True, methods=['post', 'delete'], permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
         return self.add_to_favorite_or_shopping_cart(request, pk, Favorite, 'Рецепт успешно удален из избранного')
@@ -128,24 +321,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk):
         return self.add_to_favorite_or_shopping_cart(request, pk, ShoppingCart, 'Рецепт успешно удален из списка покупок')
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='favorite', url_name='favorite-bulk',
+            permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        """Добавляет в избранное или удаляет из него рецепты
+        {"recipes": [1, 2, 3]}, результат — по каждому id."""
+        return self.change_favorite_or_shopping_cart(request, Favorite)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart', url_name='shopping-cart-bulk',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        """То же для списка покупок."""
+        return self.change_favorite_or_shopping_cart(request, ShoppingCart)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated],
+            content_negotiation_class=IgnoreFormatContentNegotiation)
     def download_shopping_cart(self, request):
-        user = request.user
-        ingredients = AmountIngredient.objects.filter(
-            recipe__shopping_cart__user=user).values(
-                'ingredients__name',
-                'ingredients__measurement_unit').annotate(
-                    total_amount=Sum('amount'))
-        data = ingredients.values_list('ingredients__name',
-                                       'ingredients__measurement_unit',
-                                       'total_amount')
-        shopping_cart = 'Список покупок:\n'
-
-        recipe_count = user.shopping_cart.count()
-
-        for name, measure, amount in data:
-            shopping_cart += (f'{name.capitalize()} {amount} {measure}\n')
-
-        shopping_cart = f'Всего рецептов: {recipe_count}\n\n{shopping_cart}'
-        response = HttpResponse(shopping_cart, content_type='text/plain')
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in EXPORTERS:
+            return Response({'message': 'Неизвестный формат файла'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        export, content_type = EXPORTERS[file_format]
+        recipes_count, rows = get_shopping_list(request.user)
+        response = StreamingHttpResponse(export(recipes_count, rows),
+                                         content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_format}"')
         return response
+
+
+@api_view(['GET'])
+@permission_classes([MetricsAccess])
+def metrics(request):
+    """Метрики запросов в текстовом формате Prometheus."""
+    return HttpResponse(
+        render_prometheus(registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,10 @@
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup(set_prefix=False)
+
+from api.async_views import AsyncViewsHandler  # noqa: E402
+
+application = AsyncViewsHandler()
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -71,6 +73,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+ASGI_APPLICATION = 'backend.asgi.application'
+
 if DEBUG:
     DATABASES = {
         'default': {
@@ -92,6 +96,16 @@ else:
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -113,11 +127,15 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 6,
@@ -131,15 +149,25 @@ MEDIA_URL = 'media/'
 
 MEDIA_ROOT = BASE_DIR.joinpath('media')
 
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', default=2))
+
+IMAGE_VARIANTS_WEBP = os.getenv('IMAGE_VARIANTS_WEBP', default='') == 'True'
+
+FEED_FANOUT_WORKERS = int(os.getenv('FEED_FANOUT_WORKERS', default=1))
+
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS',
+                                          default=10000))
+
 DJOSER = {
     'SERIALIZERS': {
         'user': 'api.serializers.UsersSerializer',
+        'current_user': 'api.serializers.UsersSerializer',
     },
     'PERMISSIONS': {
         'user': ['rest_framework.permissions.IsAuthenticated'],
         'user_list': ['rest_framework.permissions.AllowAny'],
     },
-    'HIDE_USERS': False
+    'HIDE_USERS': False,
 }
 
 USE_X_FORWARDED_HOST = True
@@ -153,3 +181,23 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MAX_LEN_REPR = 30
 
 EMPTY_VALUE_ADMIN_PANEL = '-empty-'
+
+SHOPPING_LIST_PDF_FONT = os.getenv('SHOPPING_LIST_PDF_FONT')
+
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR')
+
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=5))
+
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', default='127.0.0.1').split(',')
+
+PROFILER_DIR = os.getenv('PROFILER_DIR')
+
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', default=1))
+
+PROFILER_MAX_PER_MINUTE = int(os.getenv('PROFILER_MAX_PER_MINUTE', default=10))
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT',
+                                         default=60))
+
+ASYNC_READ_THREADS = int(os.getenv('ASYNC_READ_THREADS', default=16))
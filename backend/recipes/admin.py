@@ -27,7 +27,7 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author',)
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count',)
     list_filter = ('name', 'author__username', 'tags__name')
     save_on_top = True
     inlines = (IngredientRecipeInLine, )
@@ -0,0 +1,74 @@
+from bisect import bisect_left
+from threading import Lock
+
+from .models import Ingredient
+from .versions import bump_version, get_version
+
+CATALOG_VERSION_KEY = 'ingredient_catalog_version'
+
+
+def normalize(name):
+    return name.strip().casefold().replace('ё', 'е')
+
+
+class IngredientCatalog:
+    """Неизменяемый снимок таблицы ингредиентов с индексом по префиксу."""
+
+    def __init__(self, ingredients, version=None):
+        ordered = sorted(ingredients,
+                         key=lambda item: (normalize(item.name), item.pk))
+        self.version = version
+        self._keys = tuple(normalize(item.name) for item in ordered)
+        self._items = tuple(ordered)
+        self._by_id = {item.pk: item for item in ordered}
+
+    def __len__(self):
+        return len(self._items)
+
+    def all(self):
+        return list(self._items)
+
+    def get(self, pk):
+        return self._by_id.get(pk)
+
+    def in_bulk(self, ids):
+        return {pk: self._by_id[pk] for pk in ids if pk in self._by_id}
+
+    def search(self, query):
+        """Сначала совпадения по началу названия, затем по вхождению."""
+        query = normalize(query)
+        if not query:
+            return self.all()
+        start = bisect_left(self._keys, query)
+        end = start
+        while end < len(self._keys) and self._keys[end].startswith(query):
+            end += 1
+        contains = [item for index, (key, item)
+                    in enumerate(zip(self._keys, self._items))
+                    if not start <= index < end and query in key]
+        return list(self._items[start:end]) + contains
+
+
+_catalog = None
+_lock = Lock()
+
+
+def get_catalog():
+    """Возвращает каталог текущего процесса, перестраивая его,
+    если версия изменилась (в том числе в другом процессе)."""
+    global _catalog
+    version = get_version(CATALOG_VERSION_KEY)
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+    with _lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = IngredientCatalog(Ingredient.objects.all(), version)
+        return _catalog
+
+
+def invalidate_catalog():
+    """Помечает каталоги всех процессов устаревшими."""
+    global _catalog
+    bump_version(CATALOG_VERSION_KEY)
+    _catalog = None
@@ -0,0 +1,128 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Новый рецепт раскладывается по лентам подписчиков автора в пуле потоков
+процесса пачками по BATCH_SIZE (fan-out on write), поэтому лента
+читается одним проходом по индексу (user, recipe) таблицы feed_item.
+Рецепты авторов, у которых подписчиков больше FEED_FANOUT_MAX_FOLLOWERS,
+не раскладываются: лента добирает их при чтении (fan-out on read).
+Если автор опустился ниже порога, его рецепты, опубликованные выше
+порога, вернёт в ленты команда rebuild_feeds.
+
+Рецепт записывается в feed_fanout в транзакции его создания и удаляется
+оттуда после раскладки. Если процесс перезапустили до раскладки, её
+завершит команда drain_feed_fanouts; её нужно запускать по расписанию.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users.models import Subscription
+from .models import FeedFanout, FeedItem, Recipe
+
+BATCH_SIZE = 1000
+
+_executor = None
+
+
+def fan_out(recipe_id, author_id):
+    """Добавляет рецепт в ленты подписчиков автора."""
+    followers = Subscription.objects.filter(
+        author_id=author_id,
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).order_by('user_id').values_list('user_id', flat=True)
+    last = 0
+    while True:
+        batch = list(followers.filter(user_id__gt=last)[:BATCH_SIZE])
+        FeedItem.objects.bulk_create(
+            [FeedItem(user_id=user_id, recipe_id=recipe_id)
+             for user_id in batch], ignore_conflicts=True)
+        if len(batch) < BATCH_SIZE:
+            break
+        last = batch[-1]
+    FeedFanout.objects.filter(recipe_id=recipe_id).delete()
+
+
+def _fan_out_in_worker(recipe_id, author_id):
+    try:
+        fan_out(recipe_id, author_id)
+    finally:
+        connection.close()
+
+
+def schedule_fan_out(recipe):
+    """Раскладывает рецепт по лентам в пуле потоков процесса."""
+    global _executor
+    if not settings.FEED_FANOUT_WORKERS:
+        fan_out(recipe.pk, recipe.author_id)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FEED_FANOUT_WORKERS,
+            thread_name_prefix='feed-fanout')
+    _executor.submit(_fan_out_in_worker, recipe.pk, recipe.author_id)
+
+
+def drain_fanouts(min_age=timedelta(minutes=1)):
+    """Раскладывает рецепты, оставшиеся в feed_fanout дольше min_age
+    (раскладка в прерванном процессе). Возвращает число рецептов."""
+    pending = list(FeedFanout.objects.filter(
+        created__lte=timezone.now() - min_age
+    ).order_by('recipe_id').values_list('recipe_id', 'recipe__author_id'))
+    for recipe_id, author_id in pending:
+        fan_out(recipe_id, author_id)
+    return len(pending)
+
+
+def author_followed(user_id, author_id):
+    """Добавляет в ленту прежние рецепты автора при подписке."""
+    FeedItem.objects.bulk_create([
+        FeedItem(user_id=user_id, recipe_id=recipe_id)
+        for recipe_id in Recipe.objects.filter(
+            author_id=author_id,
+            author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+        ).values_list('pk', flat=True)
+    ], ignore_conflicts=True)
+
+
+def author_unfollowed(user_id, author_id):
+    FeedItem.objects.filter(user_id=user_id,
+                            recipe__author_id=author_id).delete()
+
+
+def get_feed(user_id, before=None, limit=10):
+    """Id рецептов ленты по убыванию, меньше before, не больше limit."""
+    pushed = FeedItem.objects.filter(user_id=user_id)
+    pulled = Recipe.objects.filter(
+        author__following__user_id=user_id,
+        author__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+    if before is not None:
+        pushed = pushed.filter(recipe_id__lt=before)
+        pulled = pulled.filter(pk__lt=before)
+    ids = set(pushed.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True)[:limit])
+    ids.update(pulled.order_by('-pk').values_list('pk', flat=True)[:limit])
+    return sorted(ids, reverse=True)[:limit]
+
+
+def rebuild_feeds():
+    """Пересобирает ленты по подпискам. Возвращает число строк."""
+    rows = Subscription.objects.filter(
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+        author__recipes__isnull=False,
+    ).order_by().values_list('user_id', 'author__recipes__id')
+    count = 0
+    with transaction.atomic():
+        FeedFanout.objects.all().delete()
+        FeedItem.objects.all().delete()
+        batch = []
+        for user_id, recipe_id in rows.iterator():
+            batch.append(FeedItem(user_id=user_id, recipe_id=recipe_id))
+            if len(batch) == BATCH_SIZE:
+                FeedItem.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        FeedItem.objects.bulk_create(batch)
+    return count + len(batch)
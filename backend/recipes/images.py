@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from PIL import Image
+
+from .models import Recipe
+from .storage import image_storage
+from .versions import invalidate_recipes
+
+VARIANTS = {
+    'card': 480,
+    'detail': 1200,
+}
+EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+}
+
+_executor = None
+
+
+def variant_url(recipe, variant):
+    """URL картинки нужного размера или оригинала, пока размеры
+    не подготовлены."""
+    variants = recipe.image_variants
+    if variants.get('source') == recipe.image.name:
+        key = f'{variant}_webp' if settings.IMAGE_VARIANTS_WEBP else variant
+        if key in variants:
+            return image_storage.url(variants[key])
+    return recipe.image.url
+
+
+def render_variant(image, size, image_format):
+    copy = image.copy()
+    copy.thumbnail((size, size))
+    if image_format == 'JPEG' and copy.mode not in ('RGB', 'L'):
+        copy = copy.convert('RGB')
+    buffer = BytesIO()
+    copy.save(buffer, format=image_format)
+    return ContentFile(buffer.getvalue())
+
+
+def build_variants(name):
+    """Сохраняет уменьшенные копии картинки и их WebP-версии."""
+    with image_storage.open(name) as f:
+        image = Image.open(f)
+        image.load()
+    image_format = image.format if image.format in EXTENSIONS else 'PNG'
+    base = os.path.splitext(name)[0]
+    variants = {'source': name}
+    for variant, size in VARIANTS.items():
+        for key, variant_format in ((variant, image_format),
+                                    (f'{variant}_webp', 'WEBP')):
+            variant_name = f'{base}_{variant}{EXTENSIONS[variant_format]}'
+            if not image_storage.exists(variant_name):
+                image_storage.save_derived(
+                    variant_name, render_variant(image, size, variant_format))
+            variants[key] = variant_name
+    return variants
+
+
+def generate_variants(recipe_id, name):
+    variants = build_variants(name)
+    if Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_variants=variants):
+        invalidate_recipes()
+
+
+def _generate_in_worker(recipe_id, name):
+    try:
+        generate_variants(recipe_id, name)
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe):
+    """Готовит размеры картинки рецепта в пуле потоков процесса."""
+    global _executor
+    if not settings.IMAGE_VARIANT_WORKERS:
+        generate_variants(recipe.pk, recipe.image.name)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix='image-variants')
+    _executor.submit(_generate_in_worker, recipe.pk, recipe.image.name)
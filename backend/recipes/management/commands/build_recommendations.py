@@ -0,0 +1,28 @@
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.recommendations import TOP_K, build_neighbors
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие рецепты по совместному избранному '
+            'и корзинам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать все рецепты, а не только '
+                                 'затронутые изменениями.')
+        parser.add_argument('--top-k', type=int, default=TOP_K,
+                            help='Сколько соседей хранить для рецепта.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        recipes, neighbors = build_neighbors(full=options['full'],
+                                             top_k=options['top_k'])
+        elapsed = time.monotonic() - started
+        # ru_maxrss в Linux — в килобайтах.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, соседей: {neighbors}, '
+            f'{elapsed:.2f} с, пик памяти процесса {peak:.0f} МБ'))
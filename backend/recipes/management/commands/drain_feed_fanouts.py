@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from recipes.feed import drain_fanouts
+
+
+class Command(BaseCommand):
+    help = ('Раскладывает по лентам рецепты, раскладка которых '
+            'не завершилась, например из-за перезапуска процесса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=60,
+                            help='Не трогать раскладки моложе стольких '
+                                 'секунд: они ещё идут в пуле процесса.')
+
+    def handle(self, *args, **options):
+        count = drain_fanouts(timedelta(seconds=options['min_age']))
+        self.stdout.write(self.style.SUCCESS(f'Разложено рецептов: {count}'))
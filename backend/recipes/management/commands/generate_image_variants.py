@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Готовит уменьшенные копии картинок рецептов, где их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать размеры для всех рецептов.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        done = failed = 0
+        for recipe_id, name, variants in recipes.values_list(
+                'pk', 'image', 'image_variants').iterator():
+            if not options['all'] and variants.get('source') == name:
+                continue
+            try:
+                generate_variants(recipe_id, name)
+                done += 1
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, ошибок: {failed}'))
@@ -1,29 +1,110 @@
 import csv
+import json
 import os
+import time
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from recipes.catalog import invalidate_catalog
 from recipes.models import Ingredient
 
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+HEADER = ['name', 'measurement_unit']
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
 
-def ingredient_create(row):
-    Ingredient.objects.get_or_create(
-        name=row[0],
-        measurement_unit=row[1],
-    )
 
+def read_csv(f):
+    for row in csv.reader(f):
+        if [value.strip() for value in row] == HEADER:
+            continue
+        yield row
 
-action = {
-    "ingredients.csv": ingredient_create,
+
+def read_json(f):
+    for item in json.load(f):
+        yield [item.get('name'), item.get('measurement_unit')]
+
+
+readers = {
+    'csv': read_csv,
+    'json': read_json,
 }
 
 
+def clean_row(row):
+    """Возвращает пару (название, единица измерения) или None."""
+    if len(row) != 2 or not all(isinstance(value, str) for value in row):
+        return None
+    name, measurement_unit = (value.strip() for value in row)
+    if (not name or not measurement_unit
+            or len(name) > NAME_MAX_LENGTH
+            or len(measurement_unit) > UNIT_MAX_LENGTH):
+        return None
+    return name, measurement_unit
+
+
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=DEFAULT_PATH,
+                            help='Путь к файлу с ингредиентами.')
+        parser.add_argument('--format', choices=readers.keys(),
+                            help='Формат файла, по умолчанию по расширению.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество строк в одной вставке.')
+
     def handle(self, *args, **options):
-        path = os.path.join(settings.BASE_DIR, "data/")
-        for key in action.keys():
-            with open(path + key, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                next(reader)
-                for row in reader:
-                    action[key](row)
+        path = options['path']
+        file_format = (options['format']
+                       or os.path.splitext(path)[1].lstrip('.').lower())
+        if file_format not in readers:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size должен быть больше 0')
+
+        self.inserted = self.skipped = self.failed = 0
+        started = time.monotonic()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                rows = readers[file_format](f)
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    self.import_batch(batch)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        if self.inserted:
+            invalidate_catalog()
+
+        elapsed = time.monotonic() - started
+        total = self.inserted + self.skipped + self.failed
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {self.inserted}, пропущено: {self.skipped}, '
+            f'ошибок: {self.failed}, '
+            f'{total / elapsed if elapsed else total:.0f} строк/с'))
+
+    def import_batch(self, batch):
+        pairs = set()
+        for row in batch:
+            pair = clean_row(row)
+            if pair is None:
+                self.failed += 1
+            elif pair in pairs:
+                self.skipped += 1
+            else:
+                pairs.add(pair)
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in pairs}
+        ).values_list('name', 'measurement_unit'))
+        new = pairs - existing
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=measurement_unit)
+             for name, measurement_unit in new],
+            ignore_conflicts=True,
+        )
+        self.inserted += len(new)
+        self.skipped += len(pairs & existing)
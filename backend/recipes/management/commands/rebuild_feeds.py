@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок пользователей.'
+
+    def handle(self, *args, **options):
+        count = rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(f'Рецептов в лентах: {count}'))
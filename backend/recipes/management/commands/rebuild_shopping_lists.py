@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from recipes.shopping_cart import rebuild_lists
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает списки покупок по корзинам пользователей.'
+
+    def handle(self, *args, **options):
+        count = rebuild_lists()
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк в списках покупок: {count}'))
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.18 on 2026-10-18 19:44
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    AmountIngredient = apps.get_model('recipes', 'AmountIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['keep_id'])
+        for amount in AmountIngredient.objects.filter(ingredients__in=extra):
+            if AmountIngredient.objects.filter(
+                    recipe_id=amount.recipe_id,
+                    ingredients_id=duplicate['keep_id'],
+                    amount=amount.amount).exists():
+                amount.delete()
+            else:
+                amount.ingredients_id = duplicate['keep_id']
+                amount.save(update_fields=['ingredients'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_auto_20230307_1016'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_unit'),
+        ),
+    ]
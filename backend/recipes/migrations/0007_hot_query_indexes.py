@@ -0,0 +1,58 @@
+# Generated by Django 3.2.18 on 2026-10-18 19:58
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+AMOUNT_MAX = 32767
+
+
+def merge_duplicate_amounts(apps, schema_editor):
+    AmountIngredient = apps.get_model('recipes', 'AmountIngredient')
+    duplicates = AmountIngredient.objects.values(
+        'recipe', 'ingredients'
+    ).annotate(keep_id=Min('id'), total=Count('id'),
+               amount_sum=Sum('amount')).filter(total__gt=1)
+    for duplicate in duplicates:
+        AmountIngredient.objects.filter(id=duplicate['keep_id']).update(
+            amount=min(duplicate['amount_sum'], AMOUNT_MAX))
+        AmountIngredient.objects.filter(
+            recipe=duplicate['recipe'],
+            ingredients=duplicate['ingredients'],
+        ).exclude(id=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='amountingredient',
+            name='unique_recipe_ingredient_amount',
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shopping_cart_recipe_user_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_amounts,
+                             migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_recipe_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='amountingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredients'), name='unique_recipe_ingredient'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+SQLITE_CREATE = (
+    'CREATE VIRTUAL TABLE recipe_search USING fts5('
+    "name, text, ingredients, tokenize='unicode61 remove_diacritics 2')"
+)
+POSTGRES_CREATE = (
+    'CREATE TABLE recipe_search ('
+    'recipe_id bigint PRIMARY KEY REFERENCES recipe (id) ON DELETE CASCADE, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX recipe_search_document_idx '
+    'ON recipe_search USING GIN (document)',
+)
+
+
+def normalize(value):
+    return value.strip().casefold().replace('ё', 'е')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        insert = ('INSERT INTO recipe_search (rowid, name, text, ingredients) '
+                  'VALUES (%s, %s, %s, %s)')
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+        insert = ('INSERT INTO recipe_search (recipe_id, document) VALUES '
+                  "(%s, setweight(to_tsvector('russian', %s), 'A') || "
+                  "setweight(to_tsvector('russian', %s), 'C') || "
+                  "setweight(to_tsvector('russian', %s), 'B'))")
+    else:
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    AmountIngredient = apps.get_model('recipes', 'AmountIngredient')
+    ingredients = {}
+    for recipe_id, name in AmountIngredient.objects.values_list(
+            'recipe_id', 'ingredients__name'):
+        ingredients.setdefault(recipe_id, []).append(name)
+    rows = [
+        (pk, normalize(name), normalize(text),
+         normalize(' '.join(ingredients.get(pk, ()))))
+        for pk, name, text in Recipe.objects.values_list(
+            'id', 'name', 'text')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(insert, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
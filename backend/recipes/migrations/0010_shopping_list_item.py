@@ -0,0 +1,78 @@
+# Generated by Django 3.2.18 on 2026-10-18 20:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия recipes.units на момент миграции.
+ALIASES = {
+    'гр': 'г', 'гр.': 'г', 'г.': 'г', 'грамм': 'г',
+    'кг.': 'кг', 'килограмм': 'кг',
+    'мл.': 'мл', 'л.': 'л', 'литр': 'л',
+    'шт': 'шт.', 'штука': 'шт.',
+    'ст.л.': 'ст. л.', 'ч.л.': 'ч. л.',
+}
+BASE_UNITS = {'кг': ('г', 1000), 'л': ('мл', 1000)}
+
+
+def normalize_unit(unit):
+    unit = ' '.join(unit.lower().split())
+    unit = ALIASES.get(unit, unit)
+    return BASE_UNITS.get(unit, (unit, 1))
+
+
+def fill_shopping_lists(apps, schema_editor):
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    AmountIngredient = apps.get_model('recipes', 'AmountIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    amounts = {}
+    for recipe_id, name, unit, amount in AmountIngredient.objects.values_list(
+            'recipe_id', 'ingredients__name',
+            'ingredients__measurement_unit', 'amount'):
+        base, factor = normalize_unit(unit)
+        amounts.setdefault(recipe_id, []).append((name, base,
+                                                  amount * factor))
+    items = {}
+    for user_id, recipe_id in ShoppingCart.objects.values_list(
+            'user_id', 'recipe_id'):
+        for name, unit, amount in amounts.get(recipe_id, ()):
+            item = items.get((user_id, name, unit))
+            if item is None:
+                item = items[user_id, name, unit] = ShoppingListItem(
+                    user_id=user_id, name=name, measurement_unit=unit)
+            item.amount += amount
+            item.entries += 1
+    ShoppingListItem.objects.bulk_create(items.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Ингредиент')),
+                ('measurement_unit', models.CharField(max_length=40, verbose_name='Единица измерения')),
+                ('amount', models.PositiveBigIntegerField(default=0, verbose_name='Количество')),
+                ('entries', models.PositiveIntegerField(default=0, help_text='Сколько ингредиентов рецептов корзины дают строку', verbose_name='Позиций в рецептах')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Юзер')),
+            ],
+            options={
+                'verbose_name': 'Строка списка покупок',
+                'verbose_name_plural': 'Строки списков покупок',
+                'db_table': 'shopping_list_item',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'name', 'measurement_unit'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_lists,
+                             migrations.RunPython.noop),
+    ]
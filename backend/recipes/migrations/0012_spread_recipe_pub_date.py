@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def spread_pub_dates(apps, schema_editor):
+    """Рецепты, получившие в 0004 одно и то же время публикации,
+    разводятся по микросекундам в порядке id: курсор пагинации
+    позиционируется только по pub_date, а равные значения листает
+    смещением не дальше offset_cutoff."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    shared = list(Recipe.objects.order_by().values('pub_date').annotate(
+        recipes=Count('id')).filter(recipes__gt=1).values_list(
+        'pub_date', flat=True))
+    for pub_date in shared:
+        recipes = list(Recipe.objects.filter(
+            pub_date=pub_date).order_by('id').only('id', 'pub_date'))
+        for index, recipe in enumerate(recipes):
+            recipe.pub_date = pub_date + timedelta(microseconds=index)
+        Recipe.objects.bulk_update(recipes, ['pub_date'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_feed_item'),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_pub_dates, migrations.RunPython.noop),
+    ]
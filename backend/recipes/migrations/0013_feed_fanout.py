@@ -0,0 +1,26 @@
+# Generated by Django 3.2.18 on 2026-10-18 20:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_spread_recipe_pub_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedFanout',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+            ],
+            options={
+                'verbose_name': 'Раскладка по лентам',
+                'verbose_name_plural': 'Раскладки по лентам',
+                'db_table': 'feed_fanout',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.18 on 2026-10-18 21:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_feed_fanout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField()),
+                ('modified', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'data_version',
+            },
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Exists, OuterRef, Prefetch, Value
 
 from users.models import User
+from .storage import image_storage
 
 
 class Tag(models.Model):
@@ -40,11 +42,60 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name', )
+        constraints = [models.UniqueConstraint(
+                       fields=['name', 'measurement_unit'],
+                       name='unique_ingredient_name_unit',)]
 
     def __str__(self):
         return f'{self.name}: {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self, fields=None):
+        """Подгружает тэги и ингредиенты фиксированным числом запросов
+        независимо от размера выборки. fields — поля ответа: связи
+        и описание, которых в них нет, не читаются."""
+        lookups = []
+        if fields is None or 'tags' in fields:
+            lookups.append('tags')
+        if fields is None or 'ingredients' in fields:
+            lookups.append(Prefetch(
+                'amount_ingredient',
+                queryset=AmountIngredient.objects.select_related(
+                    'ingredients')))
+        queryset = self.prefetch_related(*lookups)
+        if fields is not None and 'text' not in fields:
+            queryset = queryset.defer('text')
+        return queryset
+
+    def with_user_flags(self, user, fields=None):
+        """Аннотирует рецепты флагами is_favorited и is_in_shopping_cart.
+        Флаги не из fields остаются доступны фильтрам, но не выбираются."""
+        queryset = self
+        if fields is None or 'author' in fields:
+            queryset = queryset.select_related('author')
+        if not user.is_authenticated:
+            flags = {
+                'is_favorited': Value(False,
+                                      output_field=models.BooleanField()),
+                'is_in_shopping_cart': Value(
+                    False, output_field=models.BooleanField()),
+            }
+        else:
+            flags = {
+                'is_favorited': Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            }
+        selected = {name: flag for name, flag in flags.items()
+                    if fields is None or name in fields}
+        return queryset.annotate(**selected).alias(**{
+            name: flag for name, flag in flags.items()
+            if name not in selected})
+
+
 class Recipe(models.Model):
 
     author = models.ForeignKey(
@@ -55,7 +106,12 @@ class Recipe(models.Model):
     )
     name = models.CharField('Название',
                             max_length=200,)
-    image = models.ImageField('Картинка',)
+    image = models.ImageField('Картинка',
+                              upload_to='recipes/',
+                              storage=image_storage,)
+    image_variants = models.JSONField('Размеры картинки',
+                                      default=dict,
+                                      editable=False,)
     text = models.TextField('Описание',)
     ingredients = models.ManyToManyField(Ingredient,
                                          verbose_name='Список ингредиентов',
@@ -66,17 +122,40 @@ class Recipe(models.Model):
                                   verbose_name='Тег',)
     cooking_time = models.PositiveSmallIntegerField(
         'Время приготовления (в минутах)')
+    pub_date = models.DateTimeField('Дата публикации',
+                                    auto_now_add=True,)
+    favorites_count = models.PositiveIntegerField('В избранном',
+                                                  default=0,
+                                                  editable=False)
+    in_carts_count = models.PositiveIntegerField('В списках покупок',
+                                                 default=0,
+                                                 editable=False)
     validators = (MinValueValidator(1,
                   message='Укажите время приготовления блюда больше 0'),)
 
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         db_table = 'recipe'
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        ordering = ('-pub_date', '-id')
+        indexes = [models.Index(fields=['-pub_date', '-id'],
+                                name='recipe_pub_date_id_idx'),
+                   models.Index(fields=['author', '-pub_date', '-id'],
+                                name='recipe_author_pub_date_idx')]
 
     def __str__(self):
         return f'{self.name}'
 
+    def save(self, *args, **kwargs):
+        # Счётчики меняются только через F(), не затираем их при сохранении.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.editable]
+        super().save(*args, **kwargs)
+
 
 class AmountIngredient(models.Model):
 
@@ -101,8 +180,8 @@ class AmountIngredient(models.Model):
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Количество ингридиентов'
         constraints = [models.UniqueConstraint(
-                       fields=['recipe', 'ingredients', 'amount'],
-                       name='unique_recipe_ingredient_amount',)]
+                       fields=['recipe', 'ingredients'],
+                       name='unique_recipe_ingredient',)]
 
     def __str__(self) -> str:
         return f'{self.amount} {self.ingredients}'
@@ -126,6 +205,8 @@ class Favorite(models.Model):
         constraints = [models.UniqueConstraint(
                        fields=['user', 'recipe'],
                        name='unique_favorite_amount',)]
+        indexes = [models.Index(fields=['recipe', 'user'],
+                                name='favorite_recipe_user_idx')]
 
 
 class ShoppingCart(models.Model):
@@ -145,3 +226,116 @@ class ShoppingCart(models.Model):
         constraints = [models.UniqueConstraint(
                        fields=['user', 'recipe'],
                        name='unique_shoppingcart_amount',)]
+        indexes = [models.Index(fields=['recipe', 'user'],
+                                name='shopping_cart_recipe_user_idx')]
+
+
+class ShoppingListItem(models.Model):
+    """Строка списка покупок: сумма продукта по всем рецептам корзины
+    пользователя в базовой единице измерения."""
+
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             verbose_name='Юзер',
+                             related_name='shopping_list')
+    name = models.CharField('Ингредиент', max_length=200)
+    measurement_unit = models.CharField('Единица измерения', max_length=40)
+    amount = models.PositiveBigIntegerField('Количество', default=0)
+    entries = models.PositiveIntegerField(
+        'Позиций в рецептах', default=0,
+        help_text='Сколько ингредиентов рецептов корзины дают строку')
+
+    class Meta:
+        db_table = 'shopping_list_item'
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Строки списков покупок'
+        constraints = [models.UniqueConstraint(
+                       fields=['user', 'name', 'measurement_unit'],
+                       name='unique_shopping_list_item',)]
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписчика автора, см. recipes.feed."""
+
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             verbose_name='Подписчик',
+                             related_name='feed')
+    recipe = models.ForeignKey(Recipe,
+                               on_delete=models.CASCADE,
+                               verbose_name='Рецепт',
+                               related_name='feed_items')
+
+    class Meta:
+        db_table = 'feed_item'
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+        # Лента читается только по этому индексу, без обращения
+        # к таблице.
+        constraints = [models.UniqueConstraint(
+                       fields=['user', 'recipe'],
+                       name='unique_feed_item',)]
+
+
+class FeedFanout(models.Model):
+    """Рецепт, ещё не разложенный по лентам подписчиков. Запись
+    удаляется после раскладки; оставшиеся после перезапуска процесса
+    раскладывает команда drain_feed_fanouts."""
+
+    recipe = models.OneToOneField(Recipe,
+                                  on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  verbose_name='Рецепт',
+                                  related_name='+')
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        db_table = 'feed_fanout'
+        verbose_name = 'Раскладка по лентам'
+        verbose_name_plural = 'Раскладки по лентам'
+
+
+class RecipeNeighbor(models.Model):
+    """Похожий рецепт, рассчитанный командой build_recommendations."""
+
+    recipe = models.ForeignKey(Recipe,
+                               on_delete=models.CASCADE,
+                               verbose_name='Рецепт',
+                               related_name='neighbors')
+    neighbor = models.ForeignKey(Recipe,
+                                 on_delete=models.CASCADE,
+                                 verbose_name='Похожий рецепт',
+                                 related_name='neighbor_of')
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        db_table = 'recipe_neighbor'
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [models.UniqueConstraint(
+                       fields=['recipe', 'neighbor'],
+                       name='unique_recipe_neighbor',)]
+
+
+class InteractionChange(models.Model):
+    """Журнал изменений избранного и корзин для пересчёта похожих
+    рецептов. Ссылки без внешних ключей: запись должна пережить
+    удаление пользователя или рецепта."""
+
+    user_id = models.BigIntegerField()
+    recipe_id = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'interaction_change'
+
+
+class DataVersion(models.Model):
+    """Метка версии данных (см. recipes.versions), когда кэш Django
+    живёт в памяти процесса и метки в нём не видны другим воркерам."""
+
+    key = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField()
+    modified = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'data_version'
@@ -0,0 +1,256 @@
+"""Подбор рецептов по имеющимся ингредиентам.
+
+Инвертированный индекс: ингредиент -> битовая карта рецептов, где бит i
+соответствует i-му рецепту в порядке публикации. Битовые карты — целые
+числа Python, поэтому объединение, пересечение и подсчёт совпадений
+выполняются побитовыми операциями сразу над всеми рецептами, без цикла
+по ним. Число совпавших ингредиентов каждого рецепта хранится
+в «битовых срезах»: срез k — карта рецептов, у которых установлен
+k-й бит счётчика.
+
+Каждый процесс держит свой индекс и при изменении рецептов применяет
+журнал изменений из кэша; если журнал неполный, индекс строится заново.
+Журнал ведётся только в общем кэше: без него другие процессы узнают
+об изменении лишь по метке версии в базе и перестраивают индекс.
+"""
+from threading import Lock
+
+from django.core.cache import cache
+
+from .models import AmountIngredient, Recipe
+from .versions import bump_version, get_version, shared_cache
+
+PANTRY_VERSION_KEY = 'pantry_index_version'
+CHANGE_KEY = 'pantry_index_change:{}'
+CHANGE_TIMEOUT = 60 * 60 * 24
+# Больше изменений выгоднее применить полной перестройкой.
+MAX_CHANGES = 1000
+
+
+def make_bitmap(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def ingredient_sets(recipe_ids=None):
+    """Словарь id рецепта -> множество id его ингредиентов."""
+    amounts = AmountIngredient.objects.values_list('recipe_id',
+                                                   'ingredients_id')
+    if recipe_ids is not None:
+        amounts = amounts.filter(recipe_id__in=recipe_ids)
+    result = {}
+    for recipe_id, ingredient_id in amounts.iterator(chunk_size=10000):
+        result.setdefault(recipe_id, set()).add(ingredient_id)
+    return result
+
+
+class PantryMatch:
+    """Рецепты, отсортированные по доле имеющихся ингредиентов.
+
+    Поддерживает len() и срезы, поэтому подходит для пагинатора;
+    элементы — кортежи (id рецепта, есть ингредиентов, всего).
+    """
+
+    def __init__(self, recipe_ids, groups):
+        self._recipe_ids = recipe_ids
+        # (есть, всего, битовая карта, размер группы)
+        self._groups = groups
+        self._count = sum(size for *_, size in groups)
+
+    def __len__(self):
+        return self._count
+
+    def count(self):
+        return self._count
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('PantryMatch поддерживает только срезы')
+        start, stop, _ = key.indices(self._count)
+        result = []
+        for have, total, bitmap, size in self._groups:
+            if start >= size:
+                start -= size
+                stop -= size
+                continue
+            # Внутри группы — сначала новые рецепты, то есть старшие биты.
+            index = 0
+            while bitmap and index < stop:
+                position = bitmap.bit_length() - 1
+                bitmap ^= 1 << position
+                if index >= start:
+                    result.append(
+                        (self._recipe_ids[position], have, total))
+                index += 1
+            if index >= stop:
+                break
+            start, stop = 0, stop - size
+        return result
+
+
+class PantryIndex:
+    """Неизменяемый снимок индекса ингредиент -> рецепты."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self._recipe_ids = []
+        self._positions = {}
+        self._ingredients = {}
+        self._postings = {}
+        self._by_total = {}
+
+    @classmethod
+    def build(cls, version=None):
+        index = cls(version)
+        index._recipe_ids = list(Recipe.objects.order_by(
+            'pub_date', 'id').values_list('id', flat=True))
+        index._positions = {pk: position for position, pk
+                            in enumerate(index._recipe_ids)}
+        index._ingredients = {
+            recipe_id: frozenset(ingredients)
+            for recipe_id, ingredients in ingredient_sets().items()
+            if recipe_id in index._positions
+        }
+        postings = {}
+        totals = {}
+        for recipe_id, ingredients in index._ingredients.items():
+            position = index._positions[recipe_id]
+            totals.setdefault(len(ingredients), []).append(position)
+            for ingredient_id in ingredients:
+                postings.setdefault(ingredient_id, []).append(position)
+        size = len(index._recipe_ids)
+        index._postings = {ingredient_id: make_bitmap(positions, size)
+                           for ingredient_id, positions in postings.items()}
+        index._by_total = {total: make_bitmap(positions, size)
+                           for total, positions in totals.items()}
+        return index
+
+    def __len__(self):
+        return len(self._ingredients)
+
+    def updated(self, recipe_ids, version):
+        """Копия индекса с перечитанными из базы рецептами recipe_ids."""
+        index = PantryIndex(version)
+        index._recipe_ids = list(self._recipe_ids)
+        index._positions = dict(self._positions)
+        index._ingredients = dict(self._ingredients)
+        index._postings = dict(self._postings)
+        index._by_total = dict(self._by_total)
+        current = ingredient_sets(recipe_ids)
+        existing = set(Recipe.objects.filter(
+            id__in=recipe_ids).values_list('id', flat=True))
+        for recipe_id in recipe_ids:
+            index._remove(recipe_id)
+            if recipe_id in existing:
+                index._add(recipe_id, frozenset(current.get(recipe_id, ())))
+        return index
+
+    def _remove(self, recipe_id):
+        ingredients = self._ingredients.pop(recipe_id, None)
+        if ingredients is None:
+            return
+        mask = ~(1 << self._positions[recipe_id])
+        for ingredient_id in ingredients:
+            self._postings[ingredient_id] &= mask
+        self._by_total[len(ingredients)] &= mask
+
+    def _add(self, recipe_id, ingredients):
+        if not ingredients:
+            return
+        position = self._positions.get(recipe_id)
+        if position is None:
+            # Новые рецепты самые свежие и получают следующую позицию.
+            position = self._positions[recipe_id] = len(self._recipe_ids)
+            self._recipe_ids.append(recipe_id)
+        bit = 1 << position
+        self._ingredients[recipe_id] = ingredients
+        for ingredient_id in ingredients:
+            self._postings[ingredient_id] = (
+                self._postings.get(ingredient_id, 0) | bit)
+        self._by_total[len(ingredients)] = (
+            self._by_total.get(len(ingredients), 0) | bit)
+
+    def match(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ингредиентов,
+        по убыванию доли имеющихся ингредиентов."""
+        postings = [self._postings[pk] for pk in set(ingredient_ids)
+                    if self._postings.get(pk)]
+        union = 0
+        planes = []
+        for posting in postings:
+            union |= posting
+            carry = posting
+            for level, plane in enumerate(planes):
+                planes[level], carry = plane ^ carry, plane & carry
+                if not carry:
+                    break
+            if carry:
+                planes.append(carry)
+
+        have_masks = {}
+        for have in range(1, min(len(postings), 2 ** len(planes) - 1) + 1):
+            mask = union
+            for level, plane in enumerate(planes):
+                mask &= plane if have >> level & 1 else ~plane
+            if mask:
+                have_masks[have] = mask
+
+        groups = []
+        for total, recipes in self._by_total.items():
+            for have, mask in have_masks.items():
+                if have > total:
+                    continue
+                bitmap = recipes & mask
+                if bitmap:
+                    groups.append(
+                        (have, total, bitmap, bin(bitmap).count('1')))
+        groups.sort(key=lambda group: (-group[0] / group[1], -group[0]))
+        return PantryMatch(self._recipe_ids, groups)
+
+
+_index = None
+_lock = Lock()
+
+
+def get_index():
+    """Возвращает индекс текущего процесса, догоняя его по журналу
+    изменений или перестраивая целиком."""
+    global _index
+    version = get_version(PANTRY_VERSION_KEY)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        index = _index
+        if index is not None and index.version == version:
+            return index
+        changed = None
+        if (shared_cache() and index is not None
+                and isinstance(index.version, int)
+                and 0 < version - index.version <= MAX_CHANGES):
+            keys = [CHANGE_KEY.format(number)
+                    for number in range(index.version + 1, version + 1)]
+            log = cache.get_many(keys)
+            if len(log) == len(keys):
+                changed = set(log.values())
+        if changed is None:
+            _index = PantryIndex.build(version)
+        else:
+            _index = index.updated(changed, version)
+        return _index
+
+
+def recipe_changed(recipe_id):
+    """Записывает изменение рецепта в журнал для всех процессов."""
+    version = bump_version(PANTRY_VERSION_KEY)
+    if shared_cache():
+        cache.set(CHANGE_KEY.format(version), recipe_id, CHANGE_TIMEOUT)
+
+
+def invalidate_pantry():
+    """Заставляет все процессы перестроить индекс целиком."""
+    global _index
+    bump_version(PANTRY_VERSION_KEY)
+    _index = None
@@ -0,0 +1,174 @@
+"""Похожие рецепты по совместному добавлению в избранное и корзину.
+
+Матрица пользователь × рецепт разреженная и бинарная, поэтому хранится
+как списки смежности в обе стороны (аналог CSR и CSC). Сходство
+рецептов — косинусное: число общих пользователей, делённое на корень
+из произведения числа пользователей каждого рецепта. Пользователи
+с историей больше MAX_USER_ITEMS не учитываются ни в числителе, ни
+в нормах. Для каждого рецепта в таблицу recipe_neighbor сохраняются
+top-K соседей. Если установлен scipy, число общих пользователей
+считается произведением разреженных матриц пачками по BATCH_SIZE
+рецептов, иначе — на чистом Python с тем же результатом.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from .models import (Favorite, InteractionChange, Recipe, RecipeNeighbor,
+                     ShoppingCart)
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = sparse = None
+
+TOP_K = 20
+BATCH_SIZE = 500
+# Пользователи с огромной историей почти ничего не говорят о сходстве,
+# а их вклад в стоимость расчёта квадратичный.
+MAX_USER_ITEMS = 500
+
+
+class InteractionMatrix:
+    """Разреженная матрица взаимодействий пользователей с рецептами."""
+
+    def __init__(self):
+        self.users_by_recipe = defaultdict(set)
+        self.recipes_by_user = defaultdict(set)
+
+    @classmethod
+    def load(cls):
+        matrix = cls()
+        for model in (Favorite, ShoppingCart):
+            for user_id, recipe_id in model.objects.values_list(
+                    'user_id', 'recipe_id').iterator(chunk_size=10000):
+                matrix.users_by_recipe[recipe_id].add(user_id)
+                matrix.recipes_by_user[user_id].add(recipe_id)
+        return matrix
+
+    def affected(self, recipe_ids, user_ids):
+        """Рецепты, у которых могли измениться соседи после изменения
+        взаимодействий recipe_ids и пользователей user_ids."""
+        affected = set(recipe_ids)
+        users = set(user_ids)
+        for recipe_id in recipe_ids:
+            users |= self.users_by_recipe.get(recipe_id, set())
+        for user_id in users:
+            affected |= self.recipes_by_user.get(user_id, set())
+        return affected
+
+    @cached_property
+    def counts(self):
+        """Число пользователей каждого рецепта без пользователей
+        с историей больше MAX_USER_ITEMS."""
+        counts = Counter()
+        for recipes in self.recipes_by_user.values():
+            if len(recipes) <= MAX_USER_ITEMS:
+                counts.update(recipes)
+        return counts
+
+    def neighbors(self, recipe_id, top_k=TOP_K):
+        """top-K рецептов, самых похожих на recipe_id: [(id, сходство)]."""
+        norm = self.counts[recipe_id]
+        if not norm:
+            return []
+        common = Counter()
+        for user_id in self.users_by_recipe[recipe_id]:
+            recipes = self.recipes_by_user[user_id]
+            if len(recipes) <= MAX_USER_ITEMS:
+                common.update(recipes)
+        common.pop(recipe_id, None)
+        counts = self.counts
+        return heapq.nlargest(
+            top_k,
+            ((other, count / math.sqrt(norm * counts[other]))
+             for other, count in common.items()),
+            key=lambda item: (item[1], item[0]))
+
+    def neighbors_many(self, recipe_ids, top_k=TOP_K):
+        """Соседи рецептов recipe_ids: {id: [(id, сходство)]}."""
+        if sparse is None:
+            return {recipe_id: self.neighbors(recipe_id, top_k)
+                    for recipe_id in recipe_ids}
+        result = {recipe_id: [] for recipe_id in recipe_ids}
+        columns = sorted(self.counts)
+        index = {recipe_id: column for column, recipe_id in enumerate(columns)}
+        rows, cells = [], []
+        light = [recipes for recipes in self.recipes_by_user.values()
+                 if len(recipes) <= MAX_USER_ITEMS]
+        for row, recipes in enumerate(light):
+            rows.extend([row] * len(recipes))
+            cells.extend(index[recipe_id] for recipe_id in recipes)
+        matrix = sparse.csr_matrix(
+            (numpy.ones(len(cells)), (rows, cells)),
+            shape=(len(light), len(columns)))
+        by_recipe = matrix.T.tocsr()
+        columns = numpy.array(columns)
+        norms = numpy.array([self.counts[recipe_id] for recipe_id in columns],
+                            dtype=float)
+        targets = [index[recipe_id] for recipe_id in recipe_ids
+                   if recipe_id in index]
+        for start in range(0, len(targets), BATCH_SIZE):
+            batch = targets[start:start + BATCH_SIZE]
+            common = (by_recipe[batch] @ matrix).tocsr()
+            for row, column in enumerate(batch):
+                cells = slice(common.indptr[row], common.indptr[row + 1])
+                others = common.indices[cells]
+                keep = others != column
+                others = others[keep]
+                scores = common.data[cells][keep] / numpy.sqrt(
+                    norms[column] * norms[others])
+                ids = columns[others]
+                # Как у neighbors: по сходству, при равенстве — по id.
+                top = numpy.lexsort((ids, scores))[::-1][:top_k]
+                result[int(columns[column])] = [
+                    (int(ids[i]), float(scores[i])) for i in top]
+        return result
+
+
+def build_neighbors(full=False, top_k=TOP_K):
+    """Пересчитывает таблицу похожих рецептов.
+
+    Без full пересчитываются только рецепты, затронутые изменениями
+    из журнала InteractionChange; если журнал пуст, ничего не делается.
+    Возвращает (пересчитано рецептов, записано соседей).
+    """
+    last_change = InteractionChange.objects.order_by('-id').values_list(
+        'id', flat=True).first()
+    changes = InteractionChange.objects.filter(id__lte=last_change or 0)
+    if not full:
+        if last_change is None:
+            return 0, 0
+        changed = list(changes.values_list('user_id', 'recipe_id'))
+    matrix = InteractionMatrix.load()
+    if full:
+        recipe_ids = set(matrix.users_by_recipe)
+    else:
+        recipe_ids = matrix.affected({recipe for _, recipe in changed},
+                                     {user for user, _ in changed})
+
+    neighbors = matrix.neighbors_many(recipe_ids, top_k)
+    with transaction.atomic():
+        # Рецепт мог быть удалён после загрузки матрицы.
+        alive = set(Recipe.objects.values_list('id', flat=True))
+        rows = [
+            RecipeNeighbor(recipe_id=recipe_id, neighbor_id=neighbor_id,
+                           score=score)
+            for recipe_id, similar in neighbors.items() if recipe_id in alive
+            for neighbor_id, score in similar if neighbor_id in alive
+        ]
+        if full:
+            RecipeNeighbor.objects.all().delete()
+        else:
+            recipe_ids = list(recipe_ids)
+            for start in range(0, len(recipe_ids), BATCH_SIZE):
+                RecipeNeighbor.objects.filter(
+                    recipe_id__in=recipe_ids[start:start + BATCH_SIZE]
+                ).delete()
+        RecipeNeighbor.objects.bulk_create(rows, batch_size=1000)
+        changes.delete()
+    return len(recipe_ids), len(rows)
@@ -0,0 +1,128 @@
+"""Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+
+На SQLite индекс — виртуальная таблица FTS5 (rowid = id рецепта),
+на PostgreSQL — таблица с tsvector и GIN-индексом. Таблица создаётся
+миграцией 0008, поддерживается сигналами при сохранении рецепта
+и пересобирается командой rebuild_search_index.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from .catalog import normalize
+from .models import AmountIngredient, Recipe
+
+TABLE = 'recipe_search'
+CONFIG = 'russian'
+BATCH_SIZE = 500
+# Веса полей для bm25: название, описание, ингредиенты.
+SQLITE_RANK = f'bm25({TABLE}, 10.0, 1.0, 5.0)'
+
+
+def documents(ids=None):
+    """Тексты для индекса: (id, название, описание, ингредиенты)."""
+    recipes = Recipe.objects.order_by().values_list('id', 'name', 'text')
+    amounts = AmountIngredient.objects.values_list(
+        'recipe_id', 'ingredients__name')
+    if ids is not None:
+        recipes = recipes.filter(id__in=ids)
+        amounts = amounts.filter(recipe_id__in=ids)
+    ingredients = {}
+    for recipe_id, name in amounts:
+        ingredients.setdefault(recipe_id, []).append(name)
+    return [
+        (pk, normalize(name), normalize(text),
+         normalize(' '.join(ingredients.get(pk, ()))))
+        for pk, name, text in recipes
+    ]
+
+
+def write(rows):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, name, text, ingredients) '
+                f'VALUES (%s, %s, %s, %s)', rows)
+        elif connection.vendor == 'postgresql':
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (recipe_id, document) VALUES (%s, '
+                f"setweight(to_tsvector('{CONFIG}', %s), 'A') || "
+                f"setweight(to_tsvector('{CONFIG}', %s), 'C') || "
+                f"setweight(to_tsvector('{CONFIG}', %s), 'B')) "
+                f'ON CONFLICT (recipe_id) '
+                f'DO UPDATE SET document = EXCLUDED.document', rows)
+
+
+def remove_recipes(ids):
+    ids = list(ids)
+    if not ids or connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    column = 'rowid' if connection.vendor == 'sqlite' else 'recipe_id'
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = ids[start:start + BATCH_SIZE]
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE {column} IN '
+                f'({", ".join(["%s"] * len(batch))})', batch)
+
+
+def index_recipes(ids):
+    """Переиндексирует рецепты; удалённые убирает из индекса."""
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        rows = documents(batch)
+        remove_recipes(batch)
+        write(rows)
+
+
+def rebuild_index():
+    """Пересобирает индекс целиком, возвращает число рецептов."""
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+    index_recipes(ids)
+    return len(ids)
+
+
+def match_query(query):
+    """Запрос FTS5: все слова из строки как префиксы, через И."""
+    words = re.findall(r'\w+', normalize(query))
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(queryset, query):
+    """Оставляет рецепты, подходящие под запрос, самые релевантные
+    первыми."""
+    if connection.vendor == 'sqlite':
+        query = match_query(query)
+        if not query:
+            return queryset
+        matches = RawSQL(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [query])
+        # LIMIT -1 не даёт SQLite развернуть подзапрос: MATCH выполняется
+        # один раз, а не для каждого рецепта.
+        rank = RawSQL(
+            f'SELECT rank FROM (SELECT rowid AS id, {SQLITE_RANK} AS rank '
+            f'FROM {TABLE} WHERE {TABLE} MATCH %s LIMIT -1) '
+            f'WHERE id = recipe.id', [query], output_field=FloatField())
+    elif connection.vendor == 'postgresql':
+        query = normalize(query)
+        if not query:
+            return queryset
+        tsquery = f"websearch_to_tsquery('{CONFIG}', %s)"
+        matches = RawSQL(
+            f'SELECT recipe_id FROM {TABLE} WHERE document @@ {tsquery}',
+            [query])
+        rank = RawSQL(
+            f'SELECT -ts_rank(document, {tsquery}) FROM {TABLE} '
+            f'WHERE {TABLE}.recipe_id = recipe.id', [query],
+            output_field=FloatField())
+    else:
+        return queryset.filter(name__icontains=query)
+    return queryset.filter(pk__in=matches).annotate(
+        search_rank=rank).order_by('search_rank', '-pub_date', '-id')
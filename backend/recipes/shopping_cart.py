@@ -0,0 +1,160 @@
+"""Список покупок — материализованная сумма ингредиентов корзины.
+
+Таблица shopping_list_item хранит для каждого пользователя сумму
+продукта по рецептам корзины в базовой единице (см. units). При
+добавлении рецепта в корзину к строкам прибавляется вектор его
+ингредиентов, при удалении — вычитается, при изменении ингредиентов
+рецепта всем, у кого он в корзине, прибавляется разность векторов.
+Редкие пути через сигналы (админка, каскадное удаление, переименование
+ингредиента) пересчитывают списки затронутых пользователей целиком.
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from users.models import User
+from .models import AmountIngredient, ShoppingCart, ShoppingListItem
+from .units import display_amount, normalize_unit
+
+BATCH_SIZE = 500
+
+
+def recipe_vectors(recipe_ids):
+    """Векторы ингредиентов рецептов: {id рецепта: {(название,
+    базовая единица): (количество, позиций)}}."""
+    vectors = {}
+    for recipe_id, name, unit, amount in AmountIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredients__name',
+                  'ingredients__measurement_unit', 'amount'):
+        base, factor = normalize_unit(unit)
+        vector = vectors.setdefault(recipe_id, {})
+        total, entries = vector.get((name, base), (0, 0))
+        vector[name, base] = (total + amount * factor, entries + 1)
+    return vectors
+
+
+def apply_deltas(deltas):
+    """Прибавляет к спискам покупок deltas: {(id пользователя, название,
+    единица): (количество, позиций)}. Строки без позиций удаляются."""
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    user_ids = sorted({user_id for user_id, _, _ in deltas})
+    names = {name for _, name, _ in deltas}
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = set(user_ids[start:start + BATCH_SIZE])
+        with transaction.atomic():
+            # Блокировка пользователей упорядочивает параллельные
+            # изменения одного списка, включая вставку новых строк.
+            list(User.objects.select_for_update().filter(
+                pk__in=batch).order_by('pk').values_list('pk', flat=True))
+            items = {
+                (item.user_id, item.name, item.measurement_unit): item
+                for item in ShoppingListItem.objects.filter(
+                    user_id__in=batch, name__in=names)
+            }
+            created, changed, emptied = [], [], []
+            for key, (amount, entries) in deltas.items():
+                if key[0] not in batch:
+                    continue
+                item = items.get(key)
+                if item is None:
+                    item = ShoppingListItem(user_id=key[0], name=key[1],
+                                            measurement_unit=key[2])
+                item.amount += amount
+                item.entries += entries
+                if item.pk is None:
+                    if item.entries:
+                        created.append(item)
+                elif item.entries:
+                    changed.append(item)
+                else:
+                    emptied.append(item.pk)
+            ShoppingListItem.objects.bulk_create(created)
+            ShoppingListItem.objects.bulk_update(changed,
+                                                 ['amount', 'entries'])
+            ShoppingListItem.objects.filter(pk__in=emptied).delete()
+
+
+def change_cart(user_id, recipe_ids, sign):
+    """Прибавляет (sign=1) или вычитает (sign=-1) векторы рецептов
+    из списка покупок пользователя."""
+    deltas = {}
+    for vector in recipe_vectors(recipe_ids).values():
+        for (name, unit), (amount, entries) in vector.items():
+            total, count = deltas.get((user_id, name, unit), (0, 0))
+            deltas[user_id, name, unit] = (total + sign * amount,
+                                           count + sign * entries)
+    apply_deltas(deltas)
+
+
+def recipe_ingredients_changed(recipe_id, old_vector):
+    """Переносит изменение ингредиентов рецепта в списки покупок всех,
+    у кого он в корзине; old_vector — вектор до изменения."""
+    new_vector = recipe_vectors([recipe_id]).get(recipe_id, {})
+    difference = {}
+    for key in old_vector.keys() | new_vector.keys():
+        old_amount, old_entries = old_vector.get(key, (0, 0))
+        new_amount, new_entries = new_vector.get(key, (0, 0))
+        if (old_amount, old_entries) != (new_amount, new_entries):
+            difference[key] = (new_amount - old_amount,
+                               new_entries - old_entries)
+    if not difference:
+        return
+    apply_deltas({
+        (user_id, name, unit): delta
+        for user_id in ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True)
+        for (name, unit), delta in difference.items()
+    })
+
+
+def rebuild_lists(user_ids=None):
+    """Пересчитывает с нуля списки покупок пользователей user_ids
+    (всех, если None). Возвращает число строк."""
+    # Один filter(): второй добавил бы ещё одно соединение с корзиной.
+    if user_ids is None:
+        amounts = AmountIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False)
+        items = ShoppingListItem.objects.all()
+    else:
+        user_ids = list(user_ids)
+        amounts = AmountIngredient.objects.filter(
+            recipe__shopping_cart__user_id__in=user_ids)
+        items = ShoppingListItem.objects.filter(user_id__in=user_ids)
+    rows = {}
+    for user_id, name, unit, amount, entries in amounts.values(
+        'recipe__shopping_cart__user_id', 'ingredients__name',
+        'ingredients__measurement_unit'
+    ).annotate(total=Sum('amount'), entries=Count('id')).order_by(
+    ).values_list('recipe__shopping_cart__user_id', 'ingredients__name',
+                  'ingredients__measurement_unit', 'total',
+                  'entries').iterator():
+        base, factor = normalize_unit(unit)
+        item = rows.get((user_id, name, base))
+        if item is None:
+            item = rows[user_id, name, base] = ShoppingListItem(
+                user_id=user_id, name=name, measurement_unit=base)
+        item.amount += amount * factor
+        item.entries += entries
+    with transaction.atomic():
+        items.delete()
+        ShoppingListItem.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+def get_shopping_list(user):
+    """Возвращает число рецептов в корзине и строки
+    (название, единица измерения, количество) списка покупок."""
+    recipes_count = ShoppingCart.objects.filter(
+        user=OuterRef('user')
+    ).order_by().values('user').annotate(total=Count('pk')).values('total')
+    rows = list(ShoppingListItem.objects.filter(user=user).annotate(
+        recipes_count=Subquery(recipes_count)
+    ).order_by('name', 'measurement_unit').values_list(
+        'name', 'measurement_unit', 'amount', 'recipes_count'))
+    if not rows:
+        return 0, ()
+    result = []
+    for name, unit, amount, _ in rows:
+        amount, unit = display_amount(amount, unit)
+        result.append((name, unit, amount))
+    return rows[0][3], result
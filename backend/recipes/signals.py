@@ -0,0 +1,200 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import User
+from .catalog import invalidate_catalog
+from .counters import change_counter
+from .feed import schedule_fan_out
+from .images import schedule_variants
+from .models import (AmountIngredient, Favorite, FeedFanout, Ingredient,
+                     InteractionChange, Recipe, ShoppingCart, Tag)
+from .pantry import invalidate_pantry, recipe_changed
+from .search import index_recipes, remove_recipes
+from .shopping_cart import rebuild_lists
+from .versions import (invalidate_recipes, invalidate_tags,
+                       invalidate_user_state)
+
+_bulk = threading.local()
+
+
+@contextmanager
+def bulk_operation():
+    """Внутри блока приёмники сигналов Favorite, ShoppingCart
+    и AmountIngredient ничего не делают: массовые операции API
+    обновляют счётчики, журнал и списки покупок сами."""
+    previous = in_bulk_operation()
+    _bulk.active = True
+    try:
+        yield
+    finally:
+        _bulk.active = previous
+
+
+def in_bulk_operation():
+    return getattr(_bulk, 'active', False)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    invalidate_catalog()
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(**kwargs):
+    transaction.on_commit(invalidate_pantry)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: index_recipes(
+            AmountIngredient.objects.filter(
+                ingredients=instance).values_list('recipe_id', flat=True)))
+
+
+def schedule_lists_rebuild(user_ids):
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: rebuild_lists(user_ids))
+
+
+# API меняет корзину и ингредиенты рецептов массовыми запросами
+# в bulk_operation и обновляет списки покупок приращениями сам
+# (см. shopping_cart); сигналы приходят из админки и каскадных удалений.
+@receiver(post_save, sender=Ingredient)
+def ingredient_shopping_lists_changed(instance, created, **kwargs):
+    if not created:
+        schedule_lists_rebuild(ShoppingCart.objects.filter(
+            recipe__ingredients=instance
+        ).values_list('user_id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(instance, created=True, **kwargs):
+    if in_bulk_operation():
+        return
+    if created:
+        schedule_lists_rebuild([instance.user_id])
+    invalidate_user_state(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorite_changed(instance, **kwargs):
+    if in_bulk_operation():
+        return
+    invalidate_user_state(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def interaction_changed(instance, created=True, **kwargs):
+    if in_bulk_operation():
+        return
+    if created:
+        InteractionChange.objects.create(user_id=instance.user_id,
+                                         recipe_id=instance.recipe_id)
+
+
+@receiver((post_save, post_delete), sender=AmountIngredient)
+def amount_ingredient_changed(instance, **kwargs):
+    if in_bulk_operation():
+        return
+    schedule_lists_rebuild(ShoppingCart.objects.filter(
+        recipe_id=instance.recipe_id).values_list('user_id', flat=True))
+    invalidate_recipes()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipes_changed(**kwargs):
+    invalidate_recipes()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    invalidate_tags()
+    invalidate_recipes()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_recipes()
+
+
+@receiver(post_save, sender=User)
+def author_changed(update_fields, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        invalidate_recipes()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(instance, **kwargs):
+    if (instance.image
+            and instance.image_variants.get('source') != instance.image.name):
+        transaction.on_commit(lambda: schedule_variants(instance))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+# Ингредиенты рецепта пишутся в той же транзакции, что и сам рецепт,
+# поэтому переиндексации после коммита достаточно.
+@receiver(post_save, sender=Recipe)
+def recipe_search_saved(instance, **kwargs):
+    transaction.on_commit(lambda: index_recipes([instance.pk]))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_search_deleted(instance, **kwargs):
+    remove_recipes([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_pantry_changed(instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: recipe_changed(pk))
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(instance, **kwargs):
+    if in_bulk_operation():
+        return
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_created(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(instance, **kwargs):
+    if in_bulk_operation():
+        return
+    change_counter(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_feed_created(instance, created, **kwargs):
+    if created:
+        FeedFanout.objects.create(recipe=instance)
+        transaction.on_commit(lambda: schedule_fan_out(instance))
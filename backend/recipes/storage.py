@@ -0,0 +1,32 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем, вычисленным из sha256 содержимого,
+    поэтому одинаковые картинки сохраняются один раз."""
+
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def save_derived(self, name, content):
+        """Сохраняет производный файл (например, уменьшенную копию)
+        под заданным именем."""
+        return super().save(name, content)
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,39 @@
+"""Единицы измерения ингредиентов.
+
+Количества в списке покупок хранятся в базовой единице (г, мл), поэтому
+«мука, кг» и «мука, г» складываются в одну строку. Единицы, которые
+нельзя перевести друг в друга (шт., ст. л., по вкусу), остаются как есть.
+"""
+ALIASES = {
+    'гр': 'г', 'гр.': 'г', 'г.': 'г', 'грамм': 'г',
+    'кг.': 'кг', 'килограмм': 'кг',
+    'мл.': 'мл', 'л.': 'л', 'литр': 'л',
+    'шт': 'шт.', 'штука': 'шт.',
+    'ст.л.': 'ст. л.', 'ч.л.': 'ч. л.',
+}
+# Единица -> (базовая единица, сколько базовых в одной).
+BASE_UNITS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+}
+# Базовая единица -> крупная единица для больших количеств.
+DISPLAY_UNITS = {
+    'г': ('кг', 1000),
+    'мл': ('л', 1000),
+}
+
+
+def normalize_unit(unit):
+    """Базовая единица и множитель для перевода в неё."""
+    unit = ' '.join(unit.lower().split())
+    unit = ALIASES.get(unit, unit)
+    return BASE_UNITS.get(unit, (unit, 1))
+
+
+def display_amount(amount, unit):
+    """Количество для вывода: 1500 г -> 1.5 кг."""
+    larger = DISPLAY_UNITS.get(unit)
+    if larger is None or amount < larger[1]:
+        return amount, unit
+    value = amount / larger[1]
+    return (int(value) if value.is_integer() else round(value, 3)), larger[0]
@@ -0,0 +1,107 @@
+"""Добавление рецептов в избранное и корзину и удаление из них.
+
+Строки пишутся одним INSERT ... ON CONFLICT DO NOTHING RETURNING,
+а удаляются в bulk_operation; в обоих случаях сигналы Favorite
+и ShoppingCart не срабатывают, поэтому всё, что они делают, здесь
+вызывается явно. Повторы отсекает уникальное ограничение пары, а для
+удаления изменения списков пользователя упорядочены блокировкой его
+строки (см. lock), поэтому приращения списка покупок считаются ровно
+по вставленным и удалённым строкам.
+"""
+from django.db import connection, transaction
+
+from users.models import User
+from .counters import count_subquery
+from .models import Favorite, InteractionChange, Recipe, ShoppingCart
+from .shopping_cart import change_cart
+from .signals import bulk_operation
+from .versions import invalidate_user_state
+
+COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+def lists_changed(model, user_id, recipe_ids):
+    """Пересчитывает счётчики рецептов и сбрасывает кэши пользователя."""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{COUNTERS[model]: count_subquery(model, 'recipe')})
+    InteractionChange.objects.bulk_create([
+        InteractionChange(user_id=user_id, recipe_id=recipe_id)
+        for recipe_id in recipe_ids
+    ])
+    invalidate_user_state(user_id)
+
+
+def lock(user_id, recipe_ids):
+    """Блокирует рецепты и пользователя до конца транзакции, возвращает
+    id существующих рецептов. Рецепты блокируются раньше пользователя,
+    как при правке рецепта (RecipeCreateSerializer.update), которая
+    затем блокирует пользователей в apply_deltas."""
+    found = set(Recipe.objects.select_for_update().filter(
+        pk__in=recipe_ids).order_by('pk').values_list('pk', flat=True))
+    list(User.objects.select_for_update().filter(pk=user_id).values_list(
+        'pk', flat=True))
+    return found
+
+
+def insert(model, user_id, recipe_ids):
+    """Вставляет существующие рецепты, пропуская уже добавленные,
+    и возвращает множество id вставленных."""
+    if not recipe_ids:
+        return set()
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Рецепты вставляются по порядку id, поэтому их строки
+        # блокируются в том же порядке, что и в lock.
+        cursor.execute(
+            f'INSERT INTO {model._meta.db_table} (user_id, recipe_id) '
+            f'SELECT %s, id FROM {Recipe._meta.db_table} '
+            f'WHERE id IN ({", ".join(["%s"] * len(recipe_ids))}) '
+            f'ORDER BY id ON CONFLICT DO NOTHING RETURNING recipe_id',
+            [user_id, *recipe_ids])
+        added = sorted(recipe_id for recipe_id, in cursor.fetchall())
+        if added:
+            lists_changed(model, user_id, added)
+            if model is ShoppingCart:
+                change_cart(user_id, added, 1)
+    return set(added)
+
+
+def add_recipe(model, user_id, recipe_id):
+    """Идемпотентно добавляет существующий рецепт."""
+    insert(model, user_id, [recipe_id])
+
+
+def add_recipes(model, user_id, recipe_ids):
+    """Добавляет рецепты; возвращает словарь id -> added, exists
+    или not_found в порядке recipe_ids."""
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    added = insert(model, user_id, recipe_ids)
+    found = added
+    if len(added) < len(recipe_ids):
+        found = set(Recipe.objects.filter(pk__in=recipe_ids).values_list(
+            'pk', flat=True))
+    return {
+        pk: ('added' if pk in added
+             else 'exists' if pk in found else 'not_found')
+        for pk in recipe_ids
+    }
+
+
+def remove_recipes(model, user_id, recipe_ids):
+    """Удаляет рецепты; возвращает словарь id -> removed или absent
+    в порядке recipe_ids."""
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    rows = model.objects.filter(user_id=user_id, recipe_id__in=recipe_ids)
+    with transaction.atomic():
+        lock(user_id, recipe_ids)
+        removed = set(rows.values_list('recipe_id', flat=True))
+        if removed:
+            with bulk_operation():
+                rows.delete()
+            lists_changed(model, user_id, list(removed))
+            if model is ShoppingCart:
+                change_cart(user_id, removed, -1)
+    return {pk: 'removed' if pk in removed else 'absent'
+            for pk in recipe_ids}
@@ -0,0 +1,112 @@
+"""Метки версий данных для кэшей ответов и копий данных в процессах.
+
+Метка меняется при каждой записи в данные, и всё, что построено
+на старой метке, перестаёт использоваться. Метки хранятся в кэше
+Django, если он общий для воркеров, иначе — в таблице data_version:
+кэш в памяти процесса (LocMemCache по умолчанию) не показал бы смену
+метки другим воркерам.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import DataVersion
+
+RECIPES_VERSION_KEY = 'recipes_version'
+TAGS_VERSION_KEY = 'tags_version'
+
+# Кэши в памяти процесса: запись в одном воркере не видна другим.
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def shared_cache():
+    """True, если кэш по умолчанию общий для всех воркеров."""
+    return (settings.CACHES['default']['BACKEND']
+            not in PROCESS_LOCAL_CACHES)
+
+
+def modified_key(key):
+    return f'{key}:modified'
+
+
+def get_versions(keys):
+    """{ключ: (метка версии, время её смены в unix time)}; метки,
+    которых ещё нет, заводятся."""
+    keys = list(keys)
+    if not shared_cache():
+        rows = {key: (value, modified)
+                for key, value, modified in DataVersion.objects.filter(
+                    key__in=keys).values_list('key', 'value', 'modified')}
+        missing = [key for key in keys if key not in rows]
+        if missing:
+            DataVersion.objects.bulk_create([
+                DataVersion(key=key, value=time.time_ns(),
+                            modified=int(time.time()))
+                for key in missing], ignore_conflicts=True)
+            rows.update(get_versions(missing))
+        return rows
+    values = cache.get_many(keys + [modified_key(key) for key in keys])
+    result = {}
+    for key in keys:
+        if key not in values:
+            if cache.add(key, time.time_ns(), timeout=None):
+                cache.set(modified_key(key), int(time.time()), timeout=None)
+            values[key] = cache.get(key)
+            values[modified_key(key)] = cache.get(modified_key(key))
+        result[key] = (values[key], values.get(modified_key(key)))
+    return result
+
+
+def get_version(key):
+    """Возвращает метку версии, заводя новую, если её нет."""
+    return get_versions([key])[key][0]
+
+
+def get_modified(key):
+    """Время последней смены версии (unix time)."""
+    return get_versions([key])[key][1]
+
+
+def bump_version(key):
+    """Меняет метку версии, делая устаревшими все зависящие от неё ключи.
+
+    В таблице метка — новое время в наносекундах, а не +1: метка
+    из откатившейся транзакции не достанется другим данным."""
+    if not shared_cache():
+        version = time.time_ns()
+        updated = DataVersion.objects.filter(key=key).update(
+            value=version, modified=int(time.time()))
+        if not updated:
+            DataVersion.objects.bulk_create([DataVersion(
+                key=key, value=version, modified=int(time.time()))],
+                ignore_conflicts=True)
+        return version
+    cache.set(modified_key(key), int(time.time()), timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def user_state_version_key(user_id):
+    """Версия избранного, корзины и подписок пользователя."""
+    return f'user_state_version:{user_id}'
+
+
+def invalidate_recipes():
+    """Делает устаревшими все закэшированные ответы с рецептами."""
+    bump_version(RECIPES_VERSION_KEY)
+
+
+def invalidate_tags():
+    bump_version(TAGS_VERSION_KEY)
+
+
+def invalidate_user_state(user_id):
+    bump_version(user_state_version_key(user_id))
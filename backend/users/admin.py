@@ -8,6 +8,7 @@ class SubscriptionAdmin(admin.ModelAdmin):
 
 
 class UserAdmin(admin.ModelAdmin):
+    list_display = ('username', 'email', 'recipes_count', 'followers_count')
     list_filter = ('email', 'username')
 
 
@@ -30,6 +30,12 @@ class User(AbstractUser):
                                  max_length=MAX_LEN,
                                  blank=False,
                                  help_text=USER_HELP)
+    recipes_count = models.PositiveIntegerField('Количество рецептов',
+                                                default=0,
+                                                editable=False)
+    followers_count = models.PositiveIntegerField('Количество подписчиков',
+                                                  default=0,
+                                                  editable=False)
 
     class Meta:
         db_table = 'custom_user'
@@ -48,6 +54,14 @@ class User(AbstractUser):
     def __str__(self):
         return f'{self.username}: {self.first_name}'
 
+    def save(self, *args, **kwargs):
+        # Счётчики меняются только через F(), не затираем их при сохранении.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.editable]
+        super().save(*args, **kwargs)
+
 
 class Subscription(models.Model):
     user = models.ForeignKey(
@@ -72,6 +86,8 @@ class Subscription(models.Model):
                 check=~Q(user=F('author')),
                 name='Нельзя подписаться на себя')
         ]
+        indexes = [models.Index(fields=['author', 'user'],
+                                name='subscription_author_user_idx')]
         db_table = 'subscription'
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
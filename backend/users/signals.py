@@ -0,0 +1,50 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.feed import author_followed, author_unfollowed
+from recipes.versions import invalidate_user_state
+from .models import Subscription, User
+from .tokens import invalidate_token, invalidate_user_tokens
+
+
+@receiver((post_save, post_delete), sender=Subscription)
+def subscription_changed(instance, **kwargs):
+    invalidate_user_state(instance.user_id)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F('followers_count') + 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(instance, **kwargs):
+    User.objects.filter(
+        pk=instance.author_id, followers_count__gt=0
+    ).update(followers_count=F('followers_count') - 1)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_feed_created(instance, created, **kwargs):
+    if created:
+        author_followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_feed_deleted(instance, **kwargs):
+    author_unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, update_fields, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        invalidate_user_tokens(instance.pk)
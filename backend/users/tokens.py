@@ -0,0 +1,30 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+
+from recipes.versions import shared_cache
+
+
+def token_cache_key(key):
+    """Ключ кэша для токена; сам токен в ключ не попадает."""
+    return f'auth_token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def token_cache_enabled():
+    """Токены кэшируются только в общем для всех воркеров кэше."""
+    return settings.AUTH_TOKEN_CACHE_TIMEOUT > 0 and shared_cache()
+
+
+def invalidate_token(key):
+    cache.delete(token_cache_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    """Сбрасывает закэшированные токены пользователя."""
+    cache.delete_many([
+        token_cache_key(key)
+        for key in Token.objects.filter(user_id=user_id).values_list(
+            'key', flat=True)
+    ])